@@ -3,18 +3,22 @@ import re
 import json
 import asyncio
 import discord
+import contextlib
 import datetime
-import requests
-from bs4 import BeautifulSoup
 from io import BytesIO
+from typing import Awaitable
 from dotenv import load_dotenv
 from retriever import DocumentRetriever
 from grid_client import GridClient
 from coingecko_mcp import get_crypto_context
+from link_safety import screen_urls, record_link_verdict, is_discord_invite, normalize_url
+from link_preview import LinkPreviewService
+from event_log import event_log
 from conversation_db import (
-    init_db, add_message, format_channel_history,
-    format_mood, format_memories, format_recent_happenings,
-    get_channel_status, set_channel_status, format_channel_statuses
+    init_db_async, close_db_async, add_message_async, format_channel_history_async,
+    format_mood_async, format_memories_async, format_recent_happenings_async, get_memory_async,
+    get_channel_status_async, set_channel_status_async, format_channel_statuses_async,
+    set_memory_embedder, run_maintenance_async, format_related_discussion_async
 )
 
 # Load environment variables
@@ -55,17 +59,65 @@ intents.message_content = True
 intents.messages = True  # Make sure we have message intents
 intents.reactions = True  # Need reactions for voting
 intents.members = True  # Need members intent for banning
-client = discord.Client(intents=intents)
 
-# Initialize document retriever and Grid client
+class BotClient(discord.Client):
+    """Discord client that runs background upkeep and releases shared resources on shutdown."""
+    
+    async def setup_hook(self):
+        """Start background tasks once the client has an event loop."""
+        self.maintenance_task = asyncio.create_task(run_db_maintenance())
+        self.chat_index_task = asyncio.create_task(run_chat_indexing())
+    
+    async def close(self):
+        """Close pooled connections before disconnecting."""
+        for task_name in ('maintenance_task', 'chat_index_task'):
+            task = getattr(self, task_name, None)
+            if task is not None:
+                task.cancel()
+        await grid_client.close()
+        await link_previews.close()
+        await super().close()
+        await close_db_async()  # Runs after any database work still queued
+        event_log.close()
+
+client = BotClient(intents=intents)
+
+# Initialize document retriever, Grid client and link previews
 retriever = DocumentRetriever()
 grid_client = GridClient()
+link_previews = LinkPreviewService()
 
 # Scam detection and voting
 BAN_VOTE_THRESHOLD = 3  # Number of upvotes needed to ban
 DISMISS_VOTE_THRESHOLD = 3  # Number of downvotes needed to dismiss
 pending_ban_votes = {}  # {message_id: {'target_user_id': int, 'reason': str, 'upvotes': set, 'downvotes': set}}
 
+# Prompt context gathering: each source runs within its own budget (seconds)
+DEFAULT_CONTEXT_TIMEOUT = 2.0
+CONTEXT_TIMEOUTS = {
+    'history': 2.0,
+    'related': 2.0,  # full-text search over older messages
+    'documents': 5.0,  # embedding + vector search
+    'crypto': 6.0,  # CoinGecko MCP / REST
+    'links': 4.0,  # OpenGraph fetches
+    'mood': 1.0,
+    'memories': 2.0,  # includes embedding the message for ranking
+    'happenings': 1.0,
+    'chattiness': 1.0,
+    'channel_statuses': 1.0,
+    'channel_status': 1.0,
+}
+
+# Database upkeep (retention, history trimming, vacuum) runs on this schedule
+DB_MAINTENANCE_INTERVAL = int(os.getenv('DB_MAINTENANCE_INTERVAL', str(6 * 3600)))  # seconds between runs
+DB_MAINTENANCE_START_DELAY = 60  # let startup (and init_db) finish before the first run
+
+# Stored chat history is embedded into the retriever's chat collection on this schedule
+CHAT_INDEX_INTERVAL = int(os.getenv('CHAT_INDEX_INTERVAL', '300'))  # seconds between indexing passes
+
+# Matches a streamed model response that has decided to reply
+RESPOND_TRUE_PATTERN = re.compile(r'"respond"\s*:\s*true', re.IGNORECASE)
+
 # Command prefixes
 COMMANDS = {
     'help': '!help',
@@ -78,7 +130,12 @@ COMMANDS = {
 async def on_ready():
     """Event called when the bot is ready."""
     # Initialize database
-    init_db()
+    await init_db_async()
+    
+    # Rank memory bank entries by relevance using the document embedding model
+    # (registered after init so the backfill finds the memory tables)
+    if retriever.embed_model is not None:
+        set_memory_embedder(retriever.embed_model.get_text_embedding)
     
     print(f'Logged in as {client.user} (ID: {client.user.id})')
     print(f'Bot name: {BOT_NAME}')
@@ -87,6 +144,36 @@ async def on_ready():
     print(f'Admin user ID: {ADMIN_USER_ID}')
     print('------')
 
+async def run_db_maintenance():
+    """Periodically apply message retention and compact the conversation database."""
+    await client.wait_until_ready()
+    await asyncio.sleep(DB_MAINTENANCE_START_DELAY)
+    while True:
+        try:
+            stats = await run_maintenance_async()
+            print(f"🧹 Database maintenance: removed {stats['messages_deleted']} old messages, "
+                  f"reclaimed {stats['bytes_reclaimed'] / 1024:.0f} KB")
+            event_log.log('db_maintenance', **stats)
+        except Exception as e:
+            print(f"Database maintenance failed: {e}")
+            event_log.log('db_maintenance_error', level='error', error=str(e))
+        await asyncio.sleep(DB_MAINTENANCE_INTERVAL)
+
+async def run_chat_indexing():
+    """Periodically embed new conversation windows so past chat is retrievable."""
+    await client.wait_until_ready()
+    await asyncio.sleep(DB_MAINTENANCE_START_DELAY)
+    while True:
+        try:
+            added = await asyncio.to_thread(retriever.index_chat_messages)
+            if added:
+                print(f"💬 Indexed {added} conversation window(s)")
+                event_log.log('chat_indexed', windows=added)
+        except Exception as e:
+            print(f"Chat indexing failed: {e}")
+            event_log.log('chat_index_error', level='error', error=str(e))
+        await asyncio.sleep(CHAT_INDEX_INTERVAL)
+
 def extract_urls_from_message(message_content: str) -> list[str]:
     """Extract all URLs from a message."""
     url_patterns = [
@@ -111,60 +198,28 @@ def extract_urls_from_message(message_content: str) -> list[str]:
     
     return unique_urls
 
-def extract_opengraph(url: str, timeout: int = 5) -> dict:
-    """Extract OpenGraph metadata from a URL for AI context."""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (compatible; Discordbot/2.0; +https://discordapp.com)'
-    }
+def parse_scam_verdict(result: str) -> dict:
+    """Parse the AI's JSON scam verdict, tolerating a ```json fence. Raises ValueError if it isn't one."""
+    result_clean = result.strip()
+    if result_clean.startswith('```'):
+        result_clean = result_clean.split('```')[1]
+        if result_clean.startswith('json'):
+            result_clean = result_clean[4:]
     
+    analysis = json.loads(result_clean.strip())
+    if not isinstance(analysis, dict) or not isinstance(analysis.get('is_scam'), bool):
+        raise ValueError(f"not a scam verdict: {result_clean[:100]}")
+    return analysis
+
+def is_valid_scam_verdict(result: str) -> bool:
+    """Check that an AI answer parses as a scam verdict (only those are cached)."""
     try:
-        resp = requests.get(url, headers=headers, timeout=timeout)
-        if resp.status_code != 200:
-            return {}
-        
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        og_data = {}
-        
-        for tag in soup.find_all('meta'):
-            prop = tag.get('property', '') or tag.get('name', '')
-            content = tag.get('content', '')
-            if prop in ['og:title', 'og:description', 'og:site_name', 'twitter:title', 'twitter:description']:
-                og_data[prop] = content[:500]  # Limit length
-        
-        return og_data
-    except Exception as e:
-        print(f"OpenGraph extraction failed for {url}: {e}")
-        return {}
-
-def format_link_context(urls: list[str]) -> str:
-    """Extract and format OpenGraph data for all URLs in a message."""
-    if not urls:
-        return ""
-    
-    link_info = []
-    for url in urls[:3]:  # Limit to 3 URLs to avoid slowdown
-        og = extract_opengraph(url)
-        if og:
-            title = og.get('og:title') or og.get('twitter:title', '')
-            desc = og.get('og:description') or og.get('twitter:description', '')
-            site = og.get('og:site_name', '')
-            
-            info = f"Link: {url}"
-            if site:
-                info += f"\n  Site: {site}"
-            if title:
-                info += f"\n  Title: {title}"
-            if desc:
-                info += f"\n  Description: {desc[:200]}..."
-            link_info.append(info)
-        else:
-            link_info.append(f"Link: {url} (no preview available)")
-    
-    if link_info:
-        return "\n\n=== LINK PREVIEWS ===\n" + "\n\n".join(link_info)
-    return ""
+        parse_scam_verdict(result)
+        return True
+    except ValueError:
+        return False
 
-async def analyze_message_for_scam(message_content: str, urls: list[str]) -> tuple[bool, str]:
+async def analyze_message_for_scam(message_content: str, urls: list[str], link_context: str = "") -> tuple[bool, str]:
     """Use AI Power Grid to analyze if a message with links is a scam.
     AI has full context about trusted domains and scam patterns."""
     
@@ -176,6 +231,7 @@ MESSAGE: "{message_content}"
 
 LINKS IN MESSAGE:
 {urls_text}
+{link_context}
 
 TRUSTED DOMAINS (always safe, never flag these):
 - aipowergrid.io, aipg (anything with aipg/aipowergrid)
@@ -205,21 +261,19 @@ Be specific in reason (e.g., "Discord invite link", "fake support site", "truste
 Only return the JSON, nothing else."""
     
     try:
-        result = await grid_client.get_answer(analysis_prompt, [])
+        # Verdicts are cached per normalized URL set
+        url_set_key = "scam_urls:" + " ".join(sorted({normalize_url(url) for url in urls}))
+        result = await grid_client.get_answer(analysis_prompt, [], cache='scam_verdict', cache_key=url_set_key,
+                                              validate=is_valid_scam_verdict)
         print(f"🤖 AI Scam Analysis: '{result}'")
         
         # Parse JSON response
-        result_clean = result.strip()
-        if result_clean.startswith('```'):
-            result_clean = result_clean.split('```')[1]
-            if result_clean.startswith('json'):
-                result_clean = result_clean[4:]
-        result_clean = result_clean.strip()
-        
-        analysis = json.loads(result_clean)
-        return analysis.get('is_scam', False), analysis.get('reason', 'analyzed by AI')
+        analysis = parse_scam_verdict(result)
+        is_scam, reason = analysis['is_scam'], analysis.get('reason', 'analyzed by AI')
+        record_link_verdict(urls, is_scam, reason)
+        return is_scam, reason
         
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         print(f"Failed to parse AI response: {e}, raw: '{result}'")
         # Only flag if it looks suspicious - don't flag on parse errors for trusted domains
         for trusted in ['aipg', 'etherscan', 'coingecko', 'uniswap', 'github', 'twitter']:
@@ -240,8 +294,7 @@ async def handle_scam_detection(message):
     urls = extract_urls_from_message(message.content)
     
     # Also check for Discord invite patterns that might be obfuscated
-    discord_invite_patterns = ['discord.gg', 'discord.com/invite', 'discordapp.com/invite']
-    has_discord_invite = any(pattern in message.content.lower() for pattern in discord_invite_patterns)
+    has_discord_invite = is_discord_invite(message.content)
     
     if not urls and not has_discord_invite:
         return False
@@ -252,14 +305,25 @@ async def handle_scam_detection(message):
     
     log_msg = f"🚨 SCAM CHECK: {len(urls)} URL(s) from {message.author.display_name}: {urls}"
     print(log_msg, flush=True)
-    with open('bot.log', 'a') as f:
-        f.write(log_msg + '\n')
+    event_log.log('scam_check', channel_id=message.channel.id, author=message.author.display_name,
+                  author_id=message.author.id, urls=urls)
     
-    # Let AI decide
-    is_scam, reason = await analyze_message_for_scam(message.content, urls)
+    # Decide from domain lists and cached verdicts first; only unknown domains reach the AI
+    if has_discord_invite:
+        is_scam, reason = True, "Discord invite link"
+    else:
+        verdict, unknown_urls = screen_urls(urls)
+        if verdict is not None:
+            is_scam, reason = verdict
+            print(f"⚡ URL screen decided without AI: {reason}")
+        else:
+            print(f"🔎 Unknown domain(s), asking AI: {unknown_urls}")
+            # Previews are cached, so the response path reuses these fetches
+            link_context = await link_previews.format_link_context(unknown_urls)
+            is_scam, reason = await analyze_message_for_scam(message.content, urls, link_context)
     
     if not is_scam:
-        print(f"✅ AI says safe: {reason}")
+        print(f"✅ Safe: {reason}")
         return False
     
     # Redact URLs from the original message for evidence
@@ -308,6 +372,29 @@ async def handle_scam_detection(message):
         print(f"Error creating ban vote: {e}")
         return False
 
+async def format_relevant_memories(content: str) -> str:
+    """Format the memory bank ranked against a message, embedding it on the retriever's pool."""
+    query_vector = None
+    if retriever.embed_model is not None:
+        try:
+            query_vector = await retriever.aembed_query(content)
+        except Exception as e:
+            print(f"Error embedding memory query: {e}")
+    return await format_memories_async(query_vector=query_vector)
+
+async def gather_context_source(name: str, source: Awaitable, default):
+    """Await one prompt context source within its time budget.
+    
+    Returns `default` if the source fails or is too slow.
+    """
+    try:
+        return await asyncio.wait_for(source, CONTEXT_TIMEOUTS.get(name, DEFAULT_CONTEXT_TIMEOUT))
+    except asyncio.TimeoutError:
+        print(f"⏱️ Context source '{name}' missed its deadline, skipping it")
+    except Exception as e:
+        print(f"Context source '{name}' failed: {e}")
+    return default
+
 def should_respond(message) -> bool:
     """Basic sanity checks only. AI sees conversation history and decides."""
     content = message.content
@@ -482,7 +569,7 @@ async def classify_and_respond(message):
     author_name = message.author.display_name
     
     # Always save to history (both active and readonly channels)
-    add_message(message.channel.id, author_name, content, author_id=message.author.id, is_bot=False)
+    await add_message_async(message.channel.id, author_name, content, author_id=message.author.id, is_bot=False)
     
     # Read-only channels: store only, don't respond
     if message.channel.id in BOT_READONLY_CHANNELS:
@@ -495,27 +582,36 @@ async def classify_and_respond(message):
     print(f"\n🔍 Processing: '{content[:80]}...' from {author_name}")
     
     try:
-        # Get conversation history for context
-        conversation_history = format_channel_history(message.channel.id, max_messages=10)
-        
-        # Retrieve relevant documents for the response
-        context = retriever.get_relevant_context(content)
-        
-        # Get crypto market data if relevant
-        crypto_context = await get_crypto_context(content)
-        
-        # Extract link previews if message contains URLs
+        # Gather every context source concurrently; any source that misses
+        # its time budget is dropped rather than delaying the reply
+        channel_id = message.channel.id
         urls = extract_urls_from_message(content)
-        link_context = format_link_context(urls) if urls else ""
-        
-        # Get mood, memories, and recent happenings
-        mood_info = format_mood()
-        memories_info = format_memories()
-        happenings_info = format_recent_happenings()
+        (
+            conversation_history,  # Conversation history for context
+            related_discussion,  # Older messages matching this one
+            context,  # Relevant documents for the response
+            crypto_context,  # Crypto market data if relevant
+            link_context,  # Link previews if message contains URLs
+            mood_info,
+            memories_info,
+            happenings_info,
+            chattiness_raw,  # Chattiness level from memory
+            channel_statuses,  # Cross-channel awareness
+            current_channel_status,
+        ) = await asyncio.gather(
+            gather_context_source('history', format_channel_history_async(channel_id, max_messages=10), ""),
+            gather_context_source('related', format_related_discussion_async(content, channel_id=channel_id), ""),
+            gather_context_source('documents', retriever.aget_relevant_context(content), []),
+            gather_context_source('crypto', get_crypto_context(content), ""),
+            gather_context_source('links', link_previews.format_link_context(urls), ""),
+            gather_context_source('mood', format_mood_async(), ""),
+            gather_context_source('memories', format_relevant_memories(content), ""),
+            gather_context_source('happenings', format_recent_happenings_async(), ""),
+            gather_context_source('chattiness', get_memory_async('chattiness_level'), None),
+            gather_context_source('channel_statuses', format_channel_statuses_async(channel_id), ""),
+            gather_context_source('channel_status', get_channel_status_async(channel_id), None),
+        )
         
-        # Get chattiness level from memory
-        from conversation_db import get_memory
-        chattiness_raw = get_memory('chattiness_level')
         chattiness_level = int(chattiness_raw) if chattiness_raw and chattiness_raw.isdigit() else 5  # Default to 5 (balanced)
         
         # Generate chattiness-specific guidance
@@ -526,9 +622,7 @@ async def classify_and_respond(message):
             chattiness_guidance = "\n- Be more proactive - feel free to chime in on relevant discussions even if not directly asked\n- Share insights, add context, or contribute to ongoing topics when you have something valuable to add"
         # 4-6: use default behavior (no extra guidance)
         
-        # Get channel statuses (cross-channel awareness)
-        channel_statuses = format_channel_statuses(message.channel.id)
-        current_channel_status = get_channel_status(message.channel.id) or "No status yet - this is your first time here."
+        current_channel_status = current_channel_status or "No status yet - this is your first time here."
         
         # Get channel information
         channel_name = message.channel.name if hasattr(message.channel, 'name') else f"Channel {message.channel.id}"
@@ -574,6 +668,7 @@ NOTE: Your Discord ID is {client.user.id}. If you see "<@{client.user.id}>" in t
 {chr(10).join([f"[{i+1}] {item['text']}" for i, item in enumerate(context)])}
 {crypto_context}
 {link_context}
+{related_discussion}
 
 === BEHAVIOR ===
 IMPORTANT: The "Latest message" above is what you're responding to. Focus on THAT message, not old conversation history.
@@ -607,8 +702,16 @@ Examples:
 
 Only return valid JSON."""
         
-        # Get response from Grid API (no typing indicator during decision)
-        result = await grid_client.get_answer(single_prompt, [])
+        # Stream the response from Grid API. Typing only starts once partial
+        # output shows we're actually replying, not while deciding.
+        result = ""
+        async with contextlib.AsyncExitStack() as typing_stack:
+            is_typing = False
+            async for partial_result in grid_client.stream_answer(single_prompt, []):
+                result = partial_result
+                if not is_typing and RESPOND_TRUE_PATTERN.search(partial_result):
+                    await typing_stack.enter_async_context(message.channel.typing())
+                    is_typing = True
         
         print(f"API Response: '{result}'")
         
@@ -627,7 +730,7 @@ Only return valid JSON."""
             # Always update channel status if provided (even if not responding)
             new_channel_status = response_data.get("channel_status")
             if new_channel_status:
-                set_channel_status(message.channel.id, channel_name, new_channel_status)
+                await set_channel_status_async(message.channel.id, channel_name, new_channel_status)
                 print(f"📝 Updated #{channel_name} status: {new_channel_status}")
             
             if response_data.get("respond", False):
@@ -700,13 +803,9 @@ Only return valid JSON."""
                 
                 if response_message:
                     # Add bot response to channel history
-                    add_message(message.channel.id, BOT_NAME, response_message, author_id=client.user.id, is_bot=True)
-                    
-                    # Show typing indicator for 1-2 seconds before responding
-                    async with message.channel.typing():
-                        await asyncio.sleep(1.5)  # 1.5 second delay
+                    await add_message_async(message.channel.id, BOT_NAME, response_message, author_id=client.user.id, is_bot=True)
                     
-                    # Send the response naturally
+                    # Send the response as soon as it's ready
                     await message.channel.send(response_message)
                     print(f"Responding with: '{response_message}'")
                     return True
@@ -813,12 +912,12 @@ async def on_message(message):
         content = message.content.strip()
         
         if content.startswith('!memory'):
-            from conversation_db import get_all_memories, save_memory, delete_memory
+            from conversation_db import get_all_memories_async, save_memory_async, delete_memory_async
             parts = content.split(maxsplit=2)
             cmd = parts[1] if len(parts) > 1 else 'list'
             
             if cmd == 'list':
-                memories = get_all_memories()
+                memories = await get_all_memories_async()
                 if not memories:
                     await message.reply("No memories stored.")
                 else:
@@ -827,7 +926,7 @@ async def on_message(message):
             
             elif cmd == 'delete' and len(parts) > 2:
                 key = parts[2]
-                if delete_memory(key):
+                if await delete_memory_async(key):
                     await message.reply(f"✅ Deleted memory: `{key}`")
                 else:
                     await message.reply(f"❌ Memory `{key}` not found")
@@ -836,14 +935,14 @@ async def on_message(message):
                 # !memory set key=value
                 if '=' in parts[2]:
                     key, value = parts[2].split('=', 1)
-                    save_memory(key.strip(), value.strip(), source="admin DM")
+                    await save_memory_async(key.strip(), value.strip(), source="admin DM")
                     await message.reply(f"✅ Saved: `{key.strip()}` = `{value.strip()[:50]}...`")
                 else:
                     await message.reply("Usage: `!memory set key=value`")
             
             elif cmd == 'raw' and len(parts) > 2:
                 key = parts[2]
-                memories = get_all_memories()
+                memories = await get_all_memories_async()
                 mem = next((m for m in memories if m['key'] == key), None)
                 if mem:
                     await message.reply(f"**{key}**:\n```{mem['value']}```")
@@ -856,12 +955,12 @@ async def on_message(message):
         
         # Handle chattiness control
         if content.startswith('!chattiness'):
-            from conversation_db import save_memory, get_memory
+            from conversation_db import save_memory_async, get_memory_async
             parts = content.split(maxsplit=1)
             
             if len(parts) == 1:
                 # Show current chattiness
-                current = get_memory('chattiness_level')
+                current = await get_memory_async('chattiness_level')
                 if current:
                     await message.reply(f"🗣️ Current chattiness: **{current}**")
                 else:
@@ -870,7 +969,7 @@ async def on_message(message):
                 try:
                     level = int(parts[1])
                     if 1 <= level <= 10:
-                        save_memory('chattiness_level', str(level), source="admin DM")
+                        await save_memory_async('chattiness_level', str(level), source="admin DM")
                         descriptions = {
                             1: "minimal - only when directly mentioned",
                             2: "very quiet - rarely chimes in",
@@ -899,23 +998,22 @@ async def on_message(message):
     # Ignore channels not in our lists
     channel_name = message.channel.name if hasattr(message.channel, 'name') else 'DM'
     
-    # Debug: log ALL messages to see what's coming in
+    # Debug: log ALL messages to see what's coming in (sampled in the log file)
     log_msg = f"📨 RAW: #{channel_name} ({message.channel.id}) from {message.author.display_name}: '{message.content[:50]}'"
     print(log_msg, flush=True)
-    with open('bot.log', 'a') as f:
-        f.write(log_msg + '\n')
+    event_log.debug('message_raw', channel=channel_name, channel_id=message.channel.id,
+                    author=message.author.display_name, preview=message.content[:50])
     
     if message.channel.id not in ALL_BOT_CHANNELS:
         skip_msg = f"⏭️ SKIP: #{channel_name} ({message.channel.id}) - not in channel lists"
         print(skip_msg, flush=True)
-        with open('bot.log', 'a') as f:
-            f.write(skip_msg + '\n')
+        event_log.debug('message_skip', channel=channel_name, channel_id=message.channel.id)
         return
     
     accept_msg = f"✅ ACCEPT: #{channel_name} from {message.author.display_name}"
     print(accept_msg, flush=True)
-    with open('bot.log', 'a') as f:
-        f.write(accept_msg + '\n')
+    event_log.log('message_accept', channel=channel_name, channel_id=message.channel.id,
+                  author=message.author.display_name)
     
     # Check for scam messages first (only in active channels)
     if message.channel.id in BOT_CHANNELS:
@@ -965,7 +1063,7 @@ async def on_message(message):
 Return ONLY the key, nothing else. Examples: polygon_grant_story, base_migration_info, polyvibe_details"""
             
             try:
-                key = await grid_client.get_answer(key_prompt, [])
+                key = await grid_client.get_answer(key_prompt, [], cache='memory_key')
                 key = key.strip().lower().replace(' ', '_')[:30]
                 # Fallback if AI returns something weird
                 if not key or len(key) < 3 or ' ' in key:
@@ -976,8 +1074,8 @@ Return ONLY the key, nothing else. Examples: polygon_grant_story, base_migration
                 key = '_'.join(words).lower()[:30]
             
             # Save to memory
-            from conversation_db import save_memory
-            save_memory(key, fact_text, source=f"admin ({message.author.display_name})")
+            from conversation_db import save_memory_async
+            await save_memory_async(key, fact_text, source=f"admin ({message.author.display_name})")
             
             await message.add_reaction('🧠')
             await message.reply(f"Got it! Saved as `{key}`", mention_author=False)
@@ -17,6 +17,10 @@ import requests
 COINGECKO_MCP_URL = "https://mcp.pro-api.coingecko.com/mcp"
 COINGECKO_API_KEY = os.getenv("COINGECKO_API_KEY")
 
+async def _rest_get(url: str, **kwargs) -> requests.Response:
+    """Make a CoinGecko REST request on a worker thread so it doesn't block the event loop."""
+    return await asyncio.to_thread(requests.get, url, **kwargs)
+
 async def get_coingecko_session() -> Optional[ClientSession]:
     """Get a CoinGecko MCP session for testing purposes."""
     try:
@@ -103,7 +107,7 @@ async def _get_price_via_api(coin_id: str) -> Optional[str]:
             "include_24hr_change": "true"
         }
         
-        response = requests.get(url, headers=headers, params=params, timeout=5)
+        response = await _rest_get(url, headers=headers, params=params, timeout=5)
         response.raise_for_status()
         data = response.json()
         
@@ -183,7 +187,7 @@ async def search_crypto(query: str) -> Optional[List[Dict[str, Any]]]:
             }
             params = {"query": query}
             
-            response = requests.get(url, headers=headers, params=params, timeout=5)
+            response = await _rest_get(url, headers=headers, params=params, timeout=5)
             response.raise_for_status()
             data = response.json()
             
@@ -259,7 +263,7 @@ async def get_chart_data(coin_id: str, days: int = 7) -> Optional[Dict[str, Any]
                 "X-Cg-Pro-Api-Key": COINGECKO_API_KEY,
             }
             
-            response = requests.get(url, headers=headers, params=params, timeout=10)
+            response = await _rest_get(url, headers=headers, params=params, timeout=10)
             response.raise_for_status()
             data = response.json()
             if data and "prices" in data:
@@ -290,14 +294,14 @@ async def get_ohlc_data(coin_id: str, days: int = 7) -> Optional[List[List[float
             
             # Always get hourly data for the last 24 hours to ensure we have the most recent candle
             params_hourly = {"vs_currency": "usd", "days": "1"}
-            response = requests.get(url, headers=headers, params=params_hourly, timeout=10)
+            response = await _rest_get(url, headers=headers, params=params_hourly, timeout=10)
             response.raise_for_status()
             hourly_data = response.json()
             
             if not isinstance(hourly_data, list) or len(hourly_data) == 0:
                 # Fallback to requested days if hourly fails
                 params = {"vs_currency": "usd", "days": str(days)}
-                response = requests.get(url, headers=headers, params=params, timeout=10)
+                response = await _rest_get(url, headers=headers, params=params, timeout=10)
                 response.raise_for_status()
                 data = response.json()
                 if isinstance(data, list) and len(data) > 0:
@@ -307,7 +311,7 @@ async def get_ohlc_data(coin_id: str, days: int = 7) -> Optional[List[List[float
             # If we need more than 1 day, combine with daily data
             if days > 1:
                 params_daily = {"vs_currency": "usd", "days": str(days)}
-                response_daily = requests.get(url, headers=headers, params=params_daily, timeout=10)
+                response_daily = await _rest_get(url, headers=headers, params=params_daily, timeout=10)
                 response_daily.raise_for_status()
                 daily_data = response_daily.json()
                 
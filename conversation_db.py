@@ -5,16 +5,134 @@ Uses SQLite for lightweight, persistent storage.
 import sqlite3
 import datetime
 import os
-from typing import List, Dict, Optional
+import re
+import time
+import atexit
+import asyncio
+import functools
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Dict, Optional, Tuple
 
 DB_PATH = "conversations.db"
 
-def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DB_PATH)
+# Connection tuning
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '16384'))  # page cache per connection
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(64 * 1024 * 1024)))  # bytes of the file memory-mapped for reads
+DB_BUSY_TIMEOUT_MS = 5000  # wait this long for a competing writer instead of failing
+DB_STATEMENT_CACHE_SIZE = 256  # prepared statements kept per connection
+
+# Write-behind batching for add_message()
+DB_WRITE_BATCH_SIZE = int(os.getenv('DB_WRITE_BATCH_SIZE', '50'))  # flush once this many messages are buffered
+DB_WRITE_FLUSH_MS = int(os.getenv('DB_WRITE_FLUSH_MS', '500'))  # max time a message waits before being written
+DB_RECENT_MESSAGES = int(os.getenv('DB_RECENT_MESSAGES', '50'))  # messages kept in memory per channel
+
+# Memory bank prompt injection
+MEMORY_TOP_K = int(os.getenv('MEMORY_TOP_K', '8'))  # most relevant memories injected per message
+MEMORY_TOKEN_BUDGET = int(os.getenv('MEMORY_TOKEN_BUDGET', '600'))  # approx tokens the memory block may use
+MEMORY_PINNED_KEYS = [k.strip() for k in os.getenv('MEMORY_PINNED_KEYS', 'chattiness_level').split(',') if k.strip()]
+CHARS_PER_TOKEN = 4  # rough estimate used for the token budget
+
+# Maintenance
+DB_RETENTION_DAYS = int(os.getenv('DB_RETENTION_DAYS', '30'))  # messages older than this are deleted
+DB_STATE_HISTORY_ROWS = int(os.getenv('DB_STATE_HISTORY_ROWS', '100'))  # mood/happenings rows kept
+
+# Full-text search
+SEARCH_MAX_TERMS = 12  # query terms used per search
+SEARCH_STOPWORDS = frozenset(
+    "the and for are but not you your with this that have has was were what when where which who why how "
+    "can could would should will just about from they them then than there their its it's into out our "
+    "any all some get got like one also been being does did doing".split()
+)
+
+# One persistent connection per thread; all of them are tracked so close_db() can release them
+_thread_local = threading.local()
+_open_connections: List[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+_connection_generation = 0  # bumped by close_db() so threads reopen instead of reusing closed connections
+
+# Async callers hand work to one dedicated DB thread; its queue runs commands in submission order
+_db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='conversation-db')
+
+# Messages waiting to be written, as (channel_id, author_name, author_id, content, is_bot, timestamp_ms) rows.
+# Readers merge these in, and flushes hold the lock until the rows are committed, so nothing is seen twice or lost.
+_pending_messages: List[tuple] = []
+_pending_lock = threading.Lock()
+_flush_wakeup = threading.Event()
+_flusher_thread: Optional[threading.Thread] = None
+
+# Per-channel ring of the most recent messages (also guarded by _pending_lock).
+# A channel is in _complete_rings while its ring still holds its entire history.
+_recent_messages: Dict[int, deque] = {}
+_complete_rings: set = set()
+
+# Rendered prompt fragments, tagged with the version of the state they were built from.
+# Writers bump a block's version after committing, which invalidates its fragments.
+_state_versions: Dict[str, int] = {'memory': 0, 'mood': 0, 'happenings': 0, 'channel_status': 0}
+_rendered_state: Dict[Tuple[str, Any], Tuple[int, Any]] = {}
+_state_lock = threading.Lock()
+
+# Embedding function for memories (text -> vector), registered by the bot.
+# Memories are embedded on their own thread so model forward passes never hold up the DB thread.
+_memory_embedder: Optional[Callable[[str], List[float]]] = None
+_memory_embed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='memory-embed')
+
+def _open_connection() -> sqlite3.Connection:
+    """Open a tuned connection to DB_PATH."""
+    conn = sqlite3.connect(
+        DB_PATH,
+        check_same_thread=False,  # Only used by its own thread, but close_db() may run elsewhere
+        cached_statements=DB_STATEMENT_CACHE_SIZE
+    )
     conn.row_factory = sqlite3.Row  # Return rows as dict-like objects
+    
+    # Must precede WAL to apply to a new database; run_maintenance() converts existing ones
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL lets readers run alongside the writer; NORMAL sync is safe with WAL
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    return conn
+
+def get_db_connection():
+    """Get this thread's persistent database connection (opened on first use)."""
+    conn = getattr(_thread_local, 'conn', None)
+    if (conn is None
+            or getattr(_thread_local, 'generation', None) != _connection_generation
+            or getattr(_thread_local, 'path', None) != DB_PATH):
+        conn = _open_connection()
+        with _connections_lock:
+            _open_connections.append(conn)
+            _thread_local.generation = _connection_generation
+        _thread_local.conn = conn
+        _thread_local.path = DB_PATH
     return conn
 
+def close_db():
+    """Flush buffered messages and close every persistent connection (call on shutdown)."""
+    global _connection_generation
+    flush_messages()
+    
+    with _connections_lock:
+        connections = list(_open_connections)
+        _open_connections.clear()
+        _connection_generation += 1
+    
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Error closing database connection: {e}")
+    
+    _drop_recent_messages()
+    with _state_lock:
+        _rendered_state.clear()
+
 def init_db():
     """Initialize the database with the messages, memory, and mood tables."""
     conn = get_db_connection()
@@ -76,15 +194,19 @@ def init_db():
         )
     """)
     
-    # Create indexes
+    # Create indexes (message indexes are managed by the migrations below)
     cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_channel_timestamp 
-        ON messages(channel_id, timestamp DESC)
+        CREATE INDEX IF NOT EXISTS idx_memory_key 
+        ON memory(key)
     """)
     
+    # Memory embeddings - float32 vectors used to rank memories per message
     cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_memory_key 
-        ON memory(key)
+        CREATE TABLE IF NOT EXISTS memory_embeddings (
+            key TEXT PRIMARY KEY,
+            embedding BLOB NOT NULL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
     """)
     
     # Initialize default mood if none exists
@@ -96,28 +218,255 @@ def init_db():
         """, ("chill", "Default relaxed mood", 0.5, datetime.datetime.now().isoformat()))
     
     conn.commit()
-    conn.close()
+    
+    _run_migrations(conn)
     print(f"✅ Database initialized at {DB_PATH}")
+    
+    # Memories saved before an embedder was registered (or before an upgrade) get their vectors now
+    _schedule_memory_embeddings()
+
+# ============== Schema migrations ==============
+# Each migration runs once, in order, inside its own transaction. The schema
+# version is stored in PRAGMA user_version, so existing conversations.db files
+# are upgraded in place the next time init_db() runs.
+
+def _iso_to_epoch_ms(value) -> Optional[int]:
+    """Convert a stored ISO timestamp (local time) to epoch milliseconds."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return int(datetime.datetime.fromisoformat(value).timestamp() * 1000)
+    except ValueError:
+        return None
+
+def _epoch_ms_to_iso(value: int) -> str:
+    """Convert epoch milliseconds back to the ISO format the API returns."""
+    return datetime.datetime.fromtimestamp(value / 1000).isoformat(timespec='milliseconds')
+
+def _migrate_epoch_timestamps(conn: sqlite3.Connection):
+    """Store messages.timestamp as integer epoch millis and index history queries."""
+    conn.create_function('iso_to_epoch_ms', 1, _iso_to_epoch_ms, deterministic=True)
+    conn.execute("""
+        CREATE TABLE messages_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_id INTEGER NOT NULL,
+            author_name TEXT NOT NULL,
+            author_id INTEGER,
+            content TEXT NOT NULL,
+            is_bot INTEGER DEFAULT 0,
+            timestamp INTEGER NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        INSERT INTO messages_new (id, channel_id, author_name, author_id, content, is_bot, timestamp, created_at)
+        SELECT id, channel_id, author_name, author_id, content, is_bot,
+               COALESCE(iso_to_epoch_ms(timestamp), 0), created_at
+        FROM messages
+    """)
+    conn.execute("DROP TABLE messages")
+    conn.execute("ALTER TABLE messages_new RENAME TO messages")
+    
+    # History reads filter by channel (and optionally is_bot) and order by time;
+    # retention deletes by time alone
+    conn.execute("CREATE INDEX idx_channel_timestamp ON messages(channel_id, timestamp DESC)")
+    conn.execute("CREATE INDEX idx_messages_channel_bot_timestamp ON messages(channel_id, is_bot, timestamp DESC)")
+    conn.execute("CREATE INDEX idx_messages_timestamp ON messages(timestamp)")
+
+def _migrate_state_indexes(conn: sqlite3.Connection):
+    """Index the append-only state tables by recency."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_mood_updated_at ON mood(updated_at DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_recent_happenings_updated_at ON recent_happenings(updated_at DESC)")
+
+def _migrate_messages_fts(conn: sqlite3.Connection):
+    """Mirror message content into an FTS5 index kept in sync by triggers."""
+    conn.execute("""
+        CREATE VIRTUAL TABLE messages_fts USING fts5(
+            content,
+            content='messages',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """)
+    conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+
+def _migrate_covering_history_indexes(conn: sqlite3.Connection):
+    """Replace the history indexes with covering ones that also satisfy the id tiebreaker.
+    
+    History reads select author_name/content/is_bot and order by
+    (timestamp DESC, id DESC); with every column in the index SQLite answers
+    them from the index alone, without a table lookup or a temp B-tree sort.
+    """
+    conn.execute("DROP INDEX IF EXISTS idx_channel_timestamp")
+    conn.execute("DROP INDEX IF EXISTS idx_messages_channel_bot_timestamp")
+    conn.execute("""
+        CREATE INDEX idx_messages_channel_history
+        ON messages(channel_id, timestamp DESC, id DESC, is_bot, author_name, content)
+    """)
+    conn.execute("""
+        CREATE INDEX idx_messages_channel_bot_history
+        ON messages(channel_id, is_bot, timestamp DESC, id DESC, author_name, content)
+    """)
+
+# (version, description, migration) - append new migrations, never reorder
+MIGRATIONS = [
+    (1, "integer epoch-ms message timestamps", _migrate_epoch_timestamps),
+    (2, "recency indexes for mood and recent_happenings", _migrate_state_indexes),
+    (3, "full-text search index over messages", _migrate_messages_fts),
+    (4, "covering indexes for channel history reads", _migrate_covering_history_indexes),
+]
+
+def get_schema_version(conn: Optional[sqlite3.Connection] = None) -> int:
+    """Get the schema version of the database."""
+    conn = conn or get_db_connection()
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _run_migrations(conn: sqlite3.Connection):
+    """Apply every migration newer than the database's schema version."""
+    current = get_schema_version(conn)
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        
+        print(f"🔧 Migrating database to v{version}: {description}")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        current = version
 
 def add_message(channel_id: int, author_name: str, content: str, 
                 author_id: Optional[int] = None, is_bot: bool = False):
-    """Add a message to the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    """Add a message to the database.
     
-    timestamp = datetime.datetime.now().isoformat()
+    The row is buffered and written in a batch with other messages, either once
+    DB_WRITE_BATCH_SIZE rows are waiting or after DB_WRITE_FLUSH_MS.
+    """
+    timestamp = int(time.time() * 1000)
+    row = (channel_id, author_name, author_id, content, 1 if is_bot else 0, timestamp)
     
-    cursor.execute("""
-        INSERT INTO messages (channel_id, author_name, author_id, content, is_bot, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (channel_id, author_name, author_id, content, 1 if is_bot else 0, timestamp))
+    with _pending_lock:
+        _pending_messages.append(row)
+        pending = len(_pending_messages)
+        
+        ring = _recent_messages.get(channel_id)
+        if ring is not None:
+            if len(ring) == ring.maxlen:
+                _complete_rings.discard(channel_id)
+            ring.append({'author': author_name, 'content': content, 'is_bot': bool(is_bot),
+                         'timestamp': _epoch_ms_to_iso(timestamp)})
     
-    conn.commit()
-    conn.close()
+    if pending >= DB_WRITE_BATCH_SIZE:
+        flush_messages()
+    else:
+        _ensure_flusher()
+        _flush_wakeup.set()
+
+def flush_messages() -> int:
+    """Write all buffered messages in a single transaction. Returns the number written."""
+    with _pending_lock:
+        if not _pending_messages:
+            return 0
+        
+        rows = list(_pending_messages)
+        conn = get_db_connection()
+        try:
+            with conn:
+                conn.executemany("""
+                    INSERT INTO messages (channel_id, author_name, author_id, content, is_bot, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, rows)
+        except sqlite3.Error as e:
+            # Keep the rows buffered so the next flush retries them
+            print(f"Error flushing {len(rows)} buffered messages: {e}")
+            return 0
+        
+        del _pending_messages[:len(rows)]
+        return len(rows)
+
+def _ensure_flusher():
+    """Start the background flush thread if it isn't running."""
+    global _flusher_thread
+    if _flusher_thread is not None and _flusher_thread.is_alive():
+        return
+    with _connections_lock:
+        if _flusher_thread is None or not _flusher_thread.is_alive():
+            _flusher_thread = threading.Thread(target=_run_flusher, name='conversation-db-flusher', daemon=True)
+            _flusher_thread.start()
+
+def _run_flusher():
+    """Flush loop: after the first buffered message, wait DB_WRITE_FLUSH_MS and write the batch."""
+    while True:
+        _flush_wakeup.wait()
+        time.sleep(DB_WRITE_FLUSH_MS / 1000)
+        _flush_wakeup.clear()
+        flush_messages()
+
+def _pending_for_channel(channel_id: int, exclude_bot: bool = False) -> List[tuple]:
+    """Buffered rows for a channel, oldest first (caller holds _pending_lock)."""
+    return [
+        row for row in _pending_messages
+        if row[0] == channel_id and not (exclude_bot and row[4])
+    ]
+
+def _drop_recent_messages():
+    """Forget the in-memory rings; they re-warm from SQLite on next access."""
+    with _pending_lock:
+        _recent_messages.clear()
+        _complete_rings.clear()
+
+def _warm_recent_messages(channel_id: int) -> deque:
+    """Load a channel's ring from SQLite (caller holds _pending_lock)."""
+    messages = _query_channel_messages(channel_id, DB_RECENT_MESSAGES)
+    ring = deque(messages, maxlen=DB_RECENT_MESSAGES)
+    _recent_messages[channel_id] = ring
+    if len(messages) < DB_RECENT_MESSAGES:
+        _complete_rings.add(channel_id)
+    return ring
 
 def get_channel_messages(channel_id: int, limit: int = 25, 
                         exclude_bot: bool = False) -> List[Dict]:
-    """Get recent messages for a channel."""
+    """Get recent messages for a channel.
+    
+    Served from the channel's in-memory ring when it holds enough messages,
+    otherwise read from SQLite. Includes messages not yet flushed.
+    """
+    if limit <= 0:
+        return []
+    
+    with _pending_lock:
+        ring = _recent_messages.get(channel_id)
+        if ring is None:
+            ring = _warm_recent_messages(channel_id)
+        
+        messages = [m for m in ring if not (exclude_bot and m['is_bot'])]
+        if len(messages) >= limit or channel_id in _complete_rings:
+            return [dict(m) for m in messages[-limit:]]
+        
+        return _query_channel_messages(channel_id, limit, exclude_bot)
+
+def _query_channel_messages(channel_id: int, limit: int, exclude_bot: bool = False) -> List[Dict]:
+    """Read recent messages from SQLite plus the write buffer (caller holds _pending_lock)."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -131,12 +480,12 @@ def get_channel_messages(channel_id: int, limit: int = 25,
     if exclude_bot:
         query += " AND is_bot = 0"
     
-    query += " ORDER BY timestamp DESC LIMIT ?"
+    query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
     params.append(limit)
     
     cursor.execute(query, params)
     rows = cursor.fetchall()
-    conn.close()
+    pending = _pending_for_channel(channel_id, exclude_bot)
     
     # Convert to list of dicts and reverse to get chronological order
     messages = []
@@ -145,21 +494,69 @@ def get_channel_messages(channel_id: int, limit: int = 25,
             'author': row['author_name'],
             'content': row['content'],
             'is_bot': bool(row['is_bot']),
-            'timestamp': row['timestamp']
+            'timestamp': _epoch_ms_to_iso(row['timestamp'])
+        })
+    
+    # Buffered rows are newer than anything already written
+    for channel, author_name, author_id, content, is_bot, timestamp in pending:
+        messages.append({
+            'author': author_name,
+            'content': content,
+            'is_bot': bool(is_bot),
+            'timestamp': _epoch_ms_to_iso(timestamp)
         })
     
-    return messages
+    return messages[-limit:] if limit > 0 else []
 
 def get_channel_message_count(channel_id: int) -> int:
-    """Get the total number of messages in a channel."""
+    """Get the total number of messages in a channel, including ones not yet flushed."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT COUNT(*) as count FROM messages WHERE channel_id = ?", (channel_id,))
-    result = cursor.fetchone()
-    conn.close()
+    with _pending_lock:
+        cursor.execute("SELECT COUNT(*) as count FROM messages WHERE channel_id = ?", (channel_id,))
+        result = cursor.fetchone()
+        pending = len(_pending_for_channel(channel_id))
+    
+    return (result['count'] if result else 0) + pending
+
+def get_messages_since(after_id: int = 0, limit: int = 1000, channel_id: Optional[int] = None) -> List[Dict]:
+    """Get stored messages with an id greater than `after_id`, oldest first.
+    
+    Used to feed messages incrementally into other indexes; only messages
+    already flushed to disk are returned. Pass `channel_id` to read one channel.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    if channel_id is None:
+        cursor.execute("""
+            SELECT id, channel_id, author_name, content, is_bot, timestamp
+            FROM messages
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (after_id, limit))
+    else:
+        cursor.execute("""
+            SELECT id, channel_id, author_name, content, is_bot, timestamp
+            FROM messages
+            WHERE channel_id = ? AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (channel_id, after_id, limit))
     
-    return result['count'] if result else 0
+    return [
+        {
+            'id': row['id'],
+            'channel_id': row['channel_id'],
+            'author': row['author_name'],
+            'content': row['content'],
+            'is_bot': bool(row['is_bot']),
+            'timestamp': _epoch_ms_to_iso(row['timestamp'])
+        }
+        for row in cursor.fetchall()
+    ]
 
 def format_channel_history(channel_id: int, max_messages: int = 25, 
                           exclude_bot: bool = False) -> str:
@@ -182,16 +579,108 @@ def cleanup_old_messages(days_to_keep: int = 30):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cutoff_date = (datetime.datetime.now() - datetime.timedelta(days=days_to_keep)).isoformat()
+    cutoff_ms = int((time.time() - days_to_keep * 86400) * 1000)
     
-    cursor.execute("DELETE FROM messages WHERE timestamp < ?", (cutoff_date,))
+    cursor.execute("DELETE FROM messages WHERE timestamp < ?", (cutoff_ms,))
     deleted_count = cursor.rowcount
     
     conn.commit()
-    conn.close()
+    
+    if deleted_count:
+        _drop_recent_messages()
     
     return deleted_count
 
+# Prompt state cache
+def _invalidate_state(block: str):
+    """Mark every cached fragment of a state block as stale."""
+    with _state_lock:
+        _state_versions[block] += 1
+
+def _cached_state(block: str, key: Any, render: Callable[[], Any]) -> Any:
+    """Return a cached fragment for (block, key), rendering it if stale."""
+    with _state_lock:
+        version = _state_versions[block]
+        cached = _rendered_state.get((block, key))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    
+    value = render()
+    with _state_lock:
+        # Skip storing if a write landed while we were rendering
+        if _state_versions[block] == version:
+            _rendered_state[(block, key)] = (version, value)
+    return value
+
+# Full-text search over stored messages
+def _fts_query(query: str) -> str:
+    """Turn free text into a safe FTS5 query: quoted terms joined with OR."""
+    terms = []
+    for term in re.findall(r"\w+", query.lower()):
+        if len(term) < 3 or term in SEARCH_STOPWORDS or term in terms:
+            continue
+        terms.append(term)
+    return " OR ".join(f'"{term}"' for term in terms[:SEARCH_MAX_TERMS])
+
+def search_messages(query: str, channel_id: Optional[int] = None, limit: int = 10,
+                    older_than_minutes: int = 0) -> List[Dict]:
+    """Find stored messages matching a query, best BM25 match first.
+    
+    Only messages already flushed to disk are searched. `older_than_minutes`
+    skips recent messages that are already in the prompt's chat history.
+    """
+    match = _fts_query(query)
+    if not match:
+        return []
+    
+    sql = """
+        SELECT m.channel_id, m.author_name, m.content, m.is_bot, m.timestamp, bm25(messages_fts) AS score
+        FROM messages_fts
+        JOIN messages m ON m.id = messages_fts.rowid
+        WHERE messages_fts MATCH ?
+    """
+    params: List[Any] = [match]
+    
+    if channel_id is not None:
+        sql += " AND m.channel_id = ?"
+        params.append(channel_id)
+    if older_than_minutes > 0:
+        sql += " AND m.timestamp < ?"
+        params.append(int((time.time() - older_than_minutes * 60) * 1000))
+    
+    sql += " ORDER BY score LIMIT ?"
+    params.append(limit)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    
+    return [
+        {
+            'channel_id': row['channel_id'],
+            'author': row['author_name'],
+            'content': row['content'],
+            'is_bot': bool(row['is_bot']),
+            'timestamp': _epoch_ms_to_iso(row['timestamp']),
+            'score': -row['score']  # bm25() is lower-is-better; flip so higher means more relevant
+        }
+        for row in cursor.fetchall()
+    ]
+
+def format_related_discussion(query: str, channel_id: Optional[int] = None, limit: int = 5,
+                              older_than_minutes: int = 30) -> str:
+    """Format older messages related to a query for use in prompts."""
+    results = search_messages(query, channel_id=channel_id, limit=limit, older_than_minutes=older_than_minutes)
+    if not results:
+        return ""
+    
+    lines = []
+    for msg in results:
+        date = msg['timestamp'][:10]
+        content = msg['content'] if len(msg['content']) <= 300 else msg['content'][:300] + "..."
+        lines.append(f"[{date}] {msg['author']}: {content}")
+    return "\n\n=== RELATED PAST DISCUSSION ===\n" + "\n".join(lines)
+
 # Memory bank functions
 def save_memory(key: str, value: str, source: Optional[str] = None):
     """Save or update a memory. If key exists, updates it."""
@@ -208,18 +697,24 @@ def save_memory(key: str, value: str, source: Optional[str] = None):
             source = excluded.source,
             updated_at = excluded.updated_at
     """, (key, value, source, timestamp, timestamp))
+    # The old vector no longer matches; a fresh one is embedded in the background
+    cursor.execute("DELETE FROM memory_embeddings WHERE key = ?", (key,))
     
     conn.commit()
-    conn.close()
+    _invalidate_state('memory')
+    _schedule_memory_embeddings()
 
 def get_memory(key: str) -> Optional[str]:
     """Get a memory by key."""
+    return _cached_state('memory', key, lambda: _read_memory(key))
+
+def _read_memory(key: str) -> Optional[str]:
+    """Read a memory value from the database."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute("SELECT value FROM memory WHERE key = ?", (key,))
     row = cursor.fetchone()
-    conn.close()
     
     return row['value'] if row else None
 
@@ -230,7 +725,6 @@ def get_all_memories() -> List[Dict]:
     
     cursor.execute("SELECT key, value, source, updated_at FROM memory ORDER BY updated_at DESC")
     rows = cursor.fetchall()
-    conn.close()
     
     return [
         {
@@ -242,20 +736,143 @@ def get_all_memories() -> List[Dict]:
         for row in rows
     ]
 
-def format_memories() -> str:
-    """Format all memories for use in prompts."""
-    memories = get_all_memories()
+def format_memories(query_vector: Optional[List[float]] = None, top_k: int = MEMORY_TOP_K,
+                    token_budget: int = MEMORY_TOKEN_BUDGET) -> str:
+    """Format memories for use in prompts.
+    
+    With a query embedding (from the same model as the registered embedder),
+    only pinned memories plus the `top_k` most relevant ones are included.
+    Without one, memories are listed newest first. Either way the block stays
+    within `token_budget`. The query is embedded by the caller, off the DB thread.
+    """
+    if query_vector is None or _memory_embedder is None:
+        return _cached_state('memory', ('prompt', token_budget), lambda: _render_memories(None, token_budget))
+    
+    index = _cached_state('memory', 'index', _load_memory_index)
+    if not index:
+        return ""
+    if all(vector is None for _, vector in index):
+        # Nothing embedded yet (the background embedding is still running)
+        return _cached_state('memory', ('prompt', token_budget), lambda: _render_memories(None, token_budget))
+    
+    query_vector = _normalize(query_vector)
+    scored = [
+        (sum(a * b for a, b in zip(query_vector, vector)), mem)
+        for mem, vector in index
+        if mem['key'] not in MEMORY_PINNED_KEYS and vector is not None and len(vector) == len(query_vector)
+    ]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return _render_memories([mem for _, mem in scored[:top_k]], token_budget,
+                            memories=[mem for mem, _ in index])
+
+def _render_memories(ranked: Optional[List[Dict]], token_budget: int,
+                     memories: Optional[List[Dict]] = None) -> str:
+    """Build the memory bank prompt block: pinned memories first, then `ranked` (or all memories)."""
+    if memories is None:
+        memories = get_all_memories()
     
     if not memories:
         return ""
     
+    pinned = [mem for mem in memories if mem['key'] in MEMORY_PINNED_KEYS]
+    if ranked is None:
+        ranked = [mem for mem in memories if mem['key'] not in MEMORY_PINNED_KEYS]
+    
+    max_chars = token_budget * CHARS_PER_TOKEN
     formatted = "Memory Bank (important things to remember):\n"
-    for mem in memories:
+    for mem in pinned + ranked:
         source_info = f" (from {mem['source']})" if mem['source'] else ""
-        formatted += f"- {mem['key']}: {mem['value']}{source_info}\n"
+        line = f"- {mem['key']}: {mem['value']}{source_info}\n"
+        # Pinned memories always go in; others only while they fit the budget
+        if mem['key'] not in MEMORY_PINNED_KEYS and len(formatted) + len(line) > max_chars:
+            continue
+        formatted += line
     
     return formatted
 
+def set_memory_embedder(embed_text: Optional[Callable[[str], List[float]]]):
+    """Register the function used to embed memories.
+    
+    Memories without a vector are embedded in the background. Passing None
+    disables ranking, so format_memories() falls back to listing memories
+    newest first.
+    """
+    global _memory_embedder
+    _memory_embedder = embed_text
+    _invalidate_state('memory')
+    _schedule_memory_embeddings()
+
+def _schedule_memory_embeddings():
+    """Embed memories that have no vector yet on the memory-embed thread."""
+    if _memory_embedder is not None:
+        _memory_embed_executor.submit(embed_missing_memories).add_done_callback(_log_memory_embedding_failure)
+
+def _log_memory_embedding_failure(future):
+    """Report an embedding job that failed, since nothing awaits its future."""
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Error embedding memories: {future.exception()}")
+
+def embed_missing_memories() -> int:
+    """Embed and store vectors for memories that don't have one. Returns how many were added."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT m.key, m.value FROM memory m
+        LEFT JOIN memory_embeddings e ON e.key = m.key
+        WHERE e.key IS NULL
+    """)
+    missing = cursor.fetchall()
+    
+    added = 0
+    for row in missing:
+        if _store_memory_embedding(row['key'], row['value']) is not None:
+            added += 1
+    if added:
+        _invalidate_state('memory')
+    return added
+
+def _normalize(vector: List[float]) -> array:
+    """Scale a vector to unit length so a dot product gives cosine similarity."""
+    norm = sum(x * x for x in vector) ** 0.5 or 1.0
+    return array('f', (x / norm for x in vector))
+
+def _store_memory_embedding(key: str, value: str) -> Optional[array]:
+    """Embed a memory and store its vector. Returns the normalized vector, or None."""
+    if _memory_embedder is None:
+        return None
+    
+    try:
+        vector = _normalize(_memory_embedder(f"{key}: {value}"))
+    except Exception as e:
+        print(f"Error embedding memory '{key}': {e}")
+        return None
+    
+    # Skip the write if the memory changed or was deleted while we were embedding
+    conn = get_db_connection()
+    cursor = conn.execute("""
+        INSERT INTO memory_embeddings (key, embedding, updated_at)
+        SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM memory WHERE key = ? AND value = ?)
+        ON CONFLICT(key) DO UPDATE SET
+            embedding = excluded.embedding,
+            updated_at = excluded.updated_at
+    """, (key, vector.tobytes(), datetime.datetime.now().isoformat(), key, value))
+    conn.commit()
+    return vector if cursor.rowcount > 0 else None
+
+def _load_memory_index() -> List[Tuple[Dict, Optional[array]]]:
+    """Load every memory with its vector (None until embed_missing_memories() has embedded it)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT key, embedding FROM memory_embeddings")
+    vectors = {}
+    for row in cursor.fetchall():
+        vector = array('f')
+        vector.frombytes(row['embedding'])
+        vectors[row['key']] = vector
+    
+    return [(mem, vectors.get(mem['key'])) for mem in get_all_memories()]
+
 def delete_memory(key: str) -> bool:
     """Delete a memory by key."""
     conn = get_db_connection()
@@ -263,9 +880,11 @@ def delete_memory(key: str) -> bool:
     
     cursor.execute("DELETE FROM memory WHERE key = ?", (key,))
     deleted = cursor.rowcount > 0
+    cursor.execute("DELETE FROM memory_embeddings WHERE key = ?", (key,))
     
     conn.commit()
-    conn.close()
+    if deleted:
+        _invalidate_state('memory')
     
     return deleted
 
@@ -277,7 +896,6 @@ def get_mood() -> Dict:
     
     cursor.execute("SELECT mood, description, intensity FROM mood ORDER BY updated_at DESC LIMIT 1")
     row = cursor.fetchone()
-    conn.close()
     
     if row:
         return {
@@ -320,10 +938,14 @@ def set_mood(mood: str, description: Optional[str] = None, intensity: float = 0.
     """, (mood.lower(), description, intensity, timestamp))
     
     conn.commit()
-    conn.close()
+    _invalidate_state('mood')
 
 def format_mood() -> str:
-    """Format current mood for use in prompts."""
+    """Format current mood for use in prompts (cached until the mood changes)."""
+    return _cached_state('mood', 'prompt', _render_mood)
+
+def _render_mood() -> str:
+    """Build the mood prompt line."""
     mood_data = get_mood()
     return f"Current mood: {mood_data['mood']} ({mood_data['description']}, intensity: {mood_data['intensity']:.1f})"
 
@@ -335,7 +957,6 @@ def get_recent_happenings() -> str:
     
     cursor.execute("SELECT content FROM recent_happenings ORDER BY updated_at DESC LIMIT 1")
     row = cursor.fetchone()
-    conn.close()
     
     return row['content'] if row else ""
 
@@ -357,10 +978,14 @@ def set_recent_happenings(content: str):
     """, (content, timestamp))
     
     conn.commit()
-    conn.close()
+    _invalidate_state('happenings')
 
 def format_recent_happenings() -> str:
-    """Format recent happenings for use in prompts."""
+    """Format recent happenings for use in prompts (cached until they change)."""
+    return _cached_state('happenings', 'prompt', _render_recent_happenings)
+
+def _render_recent_happenings() -> str:
+    """Build the recent happenings prompt block."""
     happenings = get_recent_happenings()
     if not happenings:
         return ""
@@ -369,6 +994,10 @@ def format_recent_happenings() -> str:
 # Channel status functions - AI-maintained summaries per channel
 def get_channel_status(channel_id: int) -> Optional[str]:
     """Get the AI-maintained status for a channel."""
+    return _cached_state('channel_status', channel_id, lambda: _read_channel_status(channel_id))
+
+def _read_channel_status(channel_id: int) -> Optional[str]:
+    """Read a channel's status from the database."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -377,7 +1006,6 @@ def get_channel_status(channel_id: int) -> Optional[str]:
         ORDER BY updated_at DESC LIMIT 1
     """, (channel_id,))
     row = cursor.fetchone()
-    conn.close()
     
     return row['status'] if row else None
 
@@ -398,7 +1026,7 @@ def set_channel_status(channel_id: int, channel_name: str, status: str):
     """, (channel_id, channel_name, status, timestamp))
     
     conn.commit()
-    conn.close()
+    _invalidate_state('channel_status')
 
 def get_all_channel_statuses() -> List[Dict]:
     """Get all channel statuses for cross-channel awareness."""
@@ -411,7 +1039,6 @@ def get_all_channel_statuses() -> List[Dict]:
         ORDER BY updated_at DESC
     """)
     rows = cursor.fetchall()
-    conn.close()
     
     return [
         {
@@ -424,7 +1051,12 @@ def get_all_channel_statuses() -> List[Dict]:
     ]
 
 def format_channel_statuses(current_channel_id: int = None) -> str:
-    """Format all channel statuses for the prompt, marking current channel."""
+    """Format all channel statuses for the prompt, marking current channel (cached until a status changes)."""
+    return _cached_state('channel_status', ('prompt', current_channel_id),
+                         lambda: _render_channel_statuses(current_channel_id))
+
+def _render_channel_statuses(current_channel_id: Optional[int]) -> str:
+    """Build the channel statuses prompt block."""
     statuses = get_all_channel_statuses()
     
     if not statuses:
@@ -437,3 +1069,95 @@ def format_channel_statuses(current_channel_id: int = None) -> str:
     
     return formatted
 
+# ============== Maintenance ==============
+
+def _database_bytes(conn: sqlite3.Connection) -> int:
+    """Current size of the database plus its WAL file."""
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    wal_path = f"{DB_PATH}-wal"
+    wal_bytes = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+    return page_count * page_size + wal_bytes
+
+def _trim_state_table(conn: sqlite3.Connection, table: str, keep: int) -> int:
+    """Delete all but the newest `keep` rows of an append-only state table."""
+    cursor = conn.execute(f"""
+        DELETE FROM {table} WHERE id NOT IN (
+            SELECT id FROM {table} ORDER BY updated_at DESC, id DESC LIMIT ?
+        )
+    """, (keep,))
+    conn.commit()
+    return cursor.rowcount
+
+def run_maintenance(retention_days: int = DB_RETENTION_DAYS,
+                    state_rows: int = DB_STATE_HISTORY_ROWS) -> Dict[str, Any]:
+    """Apply retention, trim state history, reclaim free pages and refresh statistics.
+    
+    Returns a summary of what was removed and how many bytes were reclaimed.
+    """
+    started = time.monotonic()
+    flush_messages()
+    conn = get_db_connection()
+    size_before = _database_bytes(conn)
+    
+    stats = {
+        'messages_deleted': cleanup_old_messages(retention_days),
+        'mood_rows_deleted': _trim_state_table(conn, 'mood', state_rows),
+        'happenings_rows_deleted': _trim_state_table(conn, 'recent_happenings', state_rows),
+    }
+    
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # Databases created before incremental auto-vacuum need one full VACUUM to switch over
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        conn.execute("PRAGMA incremental_vacuum")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    stats['bytes_reclaimed'] = max(0, size_before - _database_bytes(conn))
+    stats['duration_ms'] = int((time.monotonic() - started) * 1000)
+    return stats
+
+# Don't lose buffered messages if the process exits without close_db()
+atexit.register(flush_messages)
+
+# ============== Async API ==============
+
+async def run_db(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a database function on the dedicated DB thread and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+def _async_db(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Make an awaitable version of a database function that runs on the DB thread."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    wrapper.__name__ = f"{func.__name__}_async"
+    wrapper.__qualname__ = wrapper.__name__
+    return wrapper
+
+init_db_async = _async_db(init_db)
+close_db_async = _async_db(close_db)
+add_message_async = _async_db(add_message)
+flush_messages_async = _async_db(flush_messages)
+get_channel_messages_async = _async_db(get_channel_messages)
+format_channel_history_async = _async_db(format_channel_history)
+search_messages_async = _async_db(search_messages)
+format_related_discussion_async = _async_db(format_related_discussion)
+cleanup_old_messages_async = _async_db(cleanup_old_messages)
+run_maintenance_async = _async_db(run_maintenance)
+save_memory_async = _async_db(save_memory)
+get_memory_async = _async_db(get_memory)
+get_all_memories_async = _async_db(get_all_memories)
+format_memories_async = _async_db(format_memories)
+delete_memory_async = _async_db(delete_memory)
+set_mood_async = _async_db(set_mood)
+format_mood_async = _async_db(format_mood)
+set_recent_happenings_async = _async_db(set_recent_happenings)
+format_recent_happenings_async = _async_db(format_recent_happenings)
+get_channel_status_async = _async_db(get_channel_status)
+set_channel_status_async = _async_db(set_channel_status)
+format_channel_statuses_async = _async_db(format_channel_statuses)
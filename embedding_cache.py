@@ -0,0 +1,118 @@
+"""
+Cache for query embeddings.
+Keeps recent vectors in an in-memory LRU keyed by normalized query text and can
+optionally persist them to SQLite so repeated questions survive restarts.
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+EMBED_CACHE_SIZE = int(os.getenv('EMBED_CACHE_SIZE', '2048'))  # vectors kept in memory
+EMBED_CACHE_PATH = os.getenv('EMBED_CACHE_PATH', '')  # SQLite file for persistence; empty keeps the cache in memory only
+EMBED_CACHE_DISK_MAX_ENTRIES = 50000
+
+def normalize_query(text: str) -> str:
+    """Normalize query text so trivially different phrasings share a cache entry."""
+    text = re.sub(r'\s+', ' ', text.strip().lower())
+    return text.strip(' ?!.,')
+
+class EmbeddingCache:
+    """LRU cache of query embeddings with optional SQLite persistence."""
+
+    def __init__(self, model_name: str = '', path: str = EMBED_CACHE_PATH, max_entries: int = EMBED_CACHE_SIZE):
+        """Initialize the cache. `model_name` keeps vectors from different models apart on disk."""
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, List[float]]' = OrderedDict()
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._lock:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS query_embeddings (
+                        key TEXT PRIMARY KEY,
+                        embedding BLOB NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                """)
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_query_embeddings_last_used ON query_embeddings(last_used)")
+                self._conn.commit()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """Get the cached embedding for a query, or None."""
+        key = normalize_query(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+            if self._conn is not None:
+                disk_key = self._disk_key(key)
+                row = self._conn.execute(
+                    "SELECT embedding FROM query_embeddings WHERE key = ?", (disk_key,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE query_embeddings SET last_used = ? WHERE key = ?", (time.time(), disk_key))
+                    self._conn.commit()
+                    vector = array('f')
+                    vector.frombytes(row[0])
+                    embedding = vector.tolist()
+                    self._remember(key, embedding)
+                    self.hits += 1
+                    return embedding
+
+            self.misses += 1
+            return None
+
+    def set(self, text: str, embedding: List[float]):
+        """Cache the embedding for a query."""
+        key = normalize_query(text)
+        with self._lock:
+            self._remember(key, embedding)
+
+            if self._conn is not None:
+                self._conn.execute("""
+                    INSERT INTO query_embeddings (key, embedding, last_used) VALUES (?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET embedding = excluded.embedding, last_used = excluded.last_used
+                """, (self._disk_key(key), array('f', embedding).tobytes(), time.time()))
+                self._conn.execute("""
+                    DELETE FROM query_embeddings WHERE key IN (
+                        SELECT key FROM query_embeddings ORDER BY last_used ASC
+                        LIMIT MAX(0, (SELECT COUNT(*) FROM query_embeddings) - ?)
+                    )
+                """, (EMBED_CACHE_DISK_MAX_ENTRIES,))
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss counters and the in-memory entry count."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def close(self):
+        """Close the on-disk cache, if any."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key: str, embedding: List[float]):
+        """Insert into the in-memory LRU (caller holds the lock)."""
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_key(self, key: str) -> str:
+        """Hash the model name and normalized query into the on-disk key."""
+        return hashlib.sha256(f"{self.model_name}\0{key}".encode('utf-8')).hexdigest()
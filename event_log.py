@@ -0,0 +1,130 @@
+"""
+Non-blocking structured event log.
+Callers only enqueue events; a background thread writes them to disk as JSON
+lines in batches, flushes periodically and rotates the file by size.
+"""
+import os
+import json
+import queue
+import atexit
+import random
+import datetime
+import threading
+from typing import Any, Dict, List, Optional
+
+BOT_LOG_PATH = os.getenv('BOT_LOG_PATH', 'bot.log')
+BOT_LOG_MAX_BYTES = int(os.getenv('BOT_LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # rotate after this size
+BOT_LOG_BACKUP_COUNT = int(os.getenv('BOT_LOG_BACKUP_COUNT', '5'))  # rotated files to keep
+BOT_LOG_FLUSH_INTERVAL = float(os.getenv('BOT_LOG_FLUSH_INTERVAL', '1.0'))  # max seconds an event waits in memory
+BOT_LOG_DEBUG_SAMPLE_RATE = float(os.getenv('BOT_LOG_DEBUG_SAMPLE_RATE', '0.1'))  # fraction of debug events kept
+BOT_LOG_BATCH_SIZE = 500  # max events per write
+BOT_LOG_QUEUE_SIZE = 10000  # events beyond this are dropped rather than blocking
+
+_STOP = object()
+
+class EventLog:
+    """Queue-backed JSON-lines logger with a background writer thread."""
+    
+    def __init__(self, path: str = BOT_LOG_PATH, max_bytes: int = BOT_LOG_MAX_BYTES,
+                 backup_count: int = BOT_LOG_BACKUP_COUNT):
+        """Initialize the log. The writer thread starts with the first event."""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=BOT_LOG_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+    
+    def log(self, event: str, level: str = 'info', **fields: Any):
+        """Queue a structured event. Never blocks; drops the event if the queue is full."""
+        record = {
+            'ts': datetime.datetime.now().isoformat(timespec='milliseconds'),
+            'level': level,
+            'event': event,
+            **fields
+        }
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+    
+    def debug(self, event: str, sample_rate: Optional[float] = None, **fields: Any):
+        """Queue a debug event, keeping only a sampled fraction of them."""
+        rate = BOT_LOG_DEBUG_SAMPLE_RATE if sample_rate is None else sample_rate
+        if rate >= 1 or random.random() < rate:
+            self.log(event, level='debug', sample_rate=rate, **fields)
+    
+    def close(self):
+        """Flush everything queued so far and stop the writer thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+    
+    def _ensure_writer(self):
+        """Start the background writer thread if it isn't running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        """Writer loop: collect a batch, write it in one go, rotate if needed."""
+        stopping = False
+        while not stopping:
+            batch: List[Dict[str, Any]] = []
+            try:
+                item = self._queue.get(timeout=BOT_LOG_FLUSH_INTERVAL)
+            except queue.Empty:
+                continue
+            
+            # Drain whatever else is already waiting, up to one batch
+            while True:
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= BOT_LOG_BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            
+            if batch:
+                self._write(batch)
+    
+    def _write(self, batch: List[Dict[str, Any]]):
+        """Append a batch of events as JSON lines."""
+        lines = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in batch)
+        if self.dropped:
+            lines += json.dumps({'ts': datetime.datetime.now().isoformat(timespec='milliseconds'),
+                                 'level': 'warning', 'event': 'log_events_dropped', 'count': self.dropped}) + "\n"
+            self.dropped = 0
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                size = f.tell()
+            if self.max_bytes and size >= self.max_bytes:
+                self._rotate()
+        except OSError as e:
+            print(f"Error writing {self.path}: {e}")
+    
+    def _rotate(self):
+        """Shift bot.log -> bot.log.1 -> ... and start a fresh file."""
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+# Shared instance for the bot
+event_log = EventLog()
+atexit.register(event_log.close)
@@ -1,10 +1,14 @@
 import os
 import json
-import time
 import re
-import requests
-from typing import List, Dict, Any
+import time
+import asyncio
+import hashlib
+import aiohttp
+from collections import deque, OrderedDict
+from typing import List, Dict, Any, Callable, Optional, Tuple, AsyncIterator
 from dotenv import load_dotenv
+from response_cache import ResponseCache, CACHE_TTLS
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +19,91 @@ GRID_MODEL = os.getenv('GRID_MODEL', 'grid/meta-llama/llama-4-maverick-17b-128e-
 TEXT_GENERATION_ENDPOINT = 'https://api.aipowergrid.io/api/v2/generate/text/async'
 TEXT_GENERATION_STATUS_ENDPOINT = 'https://api.aipowergrid.io/api/v2/generate/text/status'
 
+# HTTP transport settings (shared, keep-alive connection pool)
+GRID_CONNECT_TIMEOUT = float(os.getenv('GRID_CONNECT_TIMEOUT', '10'))  # seconds to establish a connection
+GRID_READ_TIMEOUT = float(os.getenv('GRID_READ_TIMEOUT', '30'))  # seconds to wait for response data
+GRID_MAX_CONNECTIONS = int(os.getenv('GRID_MAX_CONNECTIONS', '20'))  # total pooled connections
+GRID_MAX_CONNECTIONS_PER_HOST = int(os.getenv('GRID_MAX_CONNECTIONS_PER_HOST', '10'))
+GRID_KEEPALIVE_TIMEOUT = float(os.getenv('GRID_KEEPALIVE_TIMEOUT', '60'))  # idle seconds before a pooled connection is dropped
+
+# Status polling settings
+GRID_POLL_INITIAL_DELAY = float(os.getenv('GRID_POLL_INITIAL_DELAY', '1.0'))  # wait before the first status check
+GRID_POLL_FAST_INTERVAL = float(os.getenv('GRID_POLL_FAST_INTERVAL', '0.75'))  # interval right after a worker picks up the job
+GRID_POLL_MAX_INTERVAL = float(os.getenv('GRID_POLL_MAX_INTERVAL', '6'))  # backoff ceiling
+GRID_POLL_BACKOFF = float(os.getenv('GRID_POLL_BACKOFF', '1.5'))  # interval multiplier per unfinished poll
+GRID_POLL_DEADLINE = float(os.getenv('GRID_POLL_DEADLINE', '120'))  # total seconds before giving up
+GRID_POLL_CONCURRENCY = int(os.getenv('GRID_POLL_CONCURRENCY', '4'))  # max status requests in flight at once
+GRID_POLL_TICK = float(os.getenv('GRID_POLL_TICK', '0.25'))  # generations due within one tick share a polling round
+POLL_STATS_HISTORY = 200  # number of recent generations kept for tuning
+
+# Identical concurrent requests share one generation; finished answers are reused briefly
+GRID_COALESCE_TTL = float(os.getenv('GRID_COALESCE_TTL', '30'))  # seconds a finished answer is reused (0 disables)
+GRID_COALESCE_MAX_ENTRIES = 256
+
+class PollSchedule:
+    """Adaptive delay calculator for polling one generation's status.
+    
+    Starts with short intervals so quick answers are picked up fast, backs off
+    exponentially while the job sits in the queue, drops back to the fast
+    interval when a worker starts processing, and never sleeps past the deadline.
+    """
+    
+    def __init__(self, deadline_seconds: float = GRID_POLL_DEADLINE):
+        self.deadline_seconds = deadline_seconds
+        self.started = time.monotonic()
+        self.deadline = self.started + deadline_seconds
+        self.interval = GRID_POLL_FAST_INTERVAL
+        self.polls = 0
+        self._was_processing = False
+    
+    def elapsed(self) -> float:
+        """Seconds since polling started."""
+        return time.monotonic() - self.started
+    
+    def remaining(self) -> float:
+        """Seconds left before the deadline."""
+        return max(0.0, self.deadline - time.monotonic())
+    
+    def first_delay(self) -> float:
+        """Delay before the first status check (a fresh job can't be done yet)."""
+        return min(GRID_POLL_INITIAL_DELAY, self.remaining())
+    
+    def next_delay(self, status_data: Dict[str, Any]) -> Optional[float]:
+        """Delay before the next poll given the latest status, or None once the deadline has passed."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            return None
+        
+        waiting = status_data.get("waiting", 0) or 0
+        processing = status_data.get("processing", 0) or 0
+        wait_time = status_data.get("wait_time", 0) or 0
+        queue_position = status_data.get("queue_position", 0) or 0
+        
+        if processing and not self._was_processing:
+            # A worker just picked the job up - it may finish any moment
+            self.interval = GRID_POLL_FAST_INTERVAL
+        else:
+            self.interval = min(self.interval * GRID_POLL_BACKOFF, GRID_POLL_MAX_INTERVAL)
+        self._was_processing = bool(processing)
+        
+        delay = self.interval
+        if waiting and not processing and (wait_time or queue_position):
+            # Still queued - trust the Grid's own estimate, but keep checking in
+            delay = min(max(delay, float(wait_time)), GRID_POLL_MAX_INTERVAL)
+        
+        return min(delay, remaining)
+
+class PendingGeneration:
+    """A submitted generation waiting on the shared status poller."""
+    
+    def __init__(self, generation_id: str, schedule: PollSchedule):
+        self.generation_id = generation_id
+        self.schedule = schedule
+        self.next_poll_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Set by stream_answer to receive partial text from in-progress status updates
+        self.partial_updates: Optional[asyncio.Queue] = None
+
 class GridClient:
     """Client for interacting with AI Power Grid API."""
     
@@ -24,12 +113,222 @@ class GridClient:
             print("Warning: GRID_API_KEY not set in environment variables")
         else:
             print(f"Using model: {GRID_MODEL}")
+        
+        # Created lazily so it binds to the running event loop
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        # Poll counts and latency for recent generations
+        self.poll_stats = deque(maxlen=POLL_STATS_HISTORY)
+        
+        # Generations awaiting results, all polled by one background task
+        self._pending: Dict[str, PendingGeneration] = {}
+        self._poller_task: Optional[asyncio.Task] = None
+        self._poller_wakeup: Optional[asyncio.Event] = None
+        
+        # Request coalescing: running generations and recent answers by request hash
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._recent_results: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        
+        # Persistent cache for deterministic helper prompts (opt-in per call site)
+        self.response_cache = ResponseCache()
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared HTTP session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=GRID_MAX_CONNECTIONS,
+                limit_per_host=GRID_MAX_CONNECTIONS_PER_HOST,
+                keepalive_timeout=GRID_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=None,  # Overall limits are enforced by the polling deadline
+                sock_connect=GRID_CONNECT_TIMEOUT,
+                sock_read=GRID_READ_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers={
+                    'apikey': GRID_API_KEY or '',
+                    'Client-Agent': 'GridRAGBot:1.0'
+                }
+            )
+        return self._session
+    
+    async def close(self):
+        """Stop the status poller and close the shared HTTP session."""
+        if self._poller_task is not None and not self._poller_task.done():
+            self._poller_task.cancel()
+            try:
+                await self._poller_task
+            except asyncio.CancelledError:
+                pass
+        self._poller_task = None
+        for pending in list(self._pending.values()):
+            self._resolve(pending, {"error": "Grid client closed", "done": False}, "cancelled")
+        
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self.response_cache.close()
     
-    async def get_answer(self, question: str, context: List[Dict[str, Any]]) -> str:
-        """Get answer from AI Power Grid API using retrieved context."""
+    async def get_answer(self, question: str, context: List[Dict[str, Any]],
+                         cache: Optional[str] = None, cache_key: Optional[str] = None,
+                         validate: Optional[Callable[[str], bool]] = None) -> str:
+        """Get answer from AI Power Grid API using retrieved context.
+        
+        Pass a call-site name from response_cache.CACHE_TTLS as `cache` to serve
+        repeats from the persistent response cache. `cache_key` replaces the
+        prompt in the cache key when the answer depends on less than the full
+        prompt (e.g. a normalized URL set). If `validate` is given, only answers
+        it accepts are cached or served from the cache.
+        """
         if not GRID_API_KEY:
             return "Error: AI Power Grid API key not configured"
         
+        request_body = self._build_request(self._build_prompt(question, context))
+        
+        # Persistent cache - only for call sites that opt in
+        persistent_key = None
+        cache_ttl = CACHE_TTLS.get(cache) if cache else None
+        if cache_ttl:
+            persistent_key = ResponseCache.make_key(
+                cache_key or request_body["prompt"], GRID_MODEL, request_body["params"]
+            )
+            cached_answer = await asyncio.to_thread(self.response_cache.get, persistent_key, cache)
+            if cached_answer is not None and (validate is None or validate(cached_answer)):
+                print(f"Response cache hit for {cache}")
+                return cached_answer
+        
+        request_key = self._request_key(request_body)
+        
+        # Identical request answered moments ago - reuse it
+        recent_answer = self._get_recent_result(request_key)
+        if recent_answer is not None:
+            print(f"Reusing recent answer for identical request {request_key[:12]}")
+            return recent_answer
+        
+        # Identical request already running - share its generation
+        generation_task = self._inflight.get(request_key)
+        owns_generation = generation_task is None
+        if not owns_generation:
+            print(f"Joining in-flight generation for identical request {request_key[:12]}")
+        else:
+            generation_task = asyncio.get_running_loop().create_task(self._generate(request_body))
+            self._inflight[request_key] = generation_task
+            generation_task.add_done_callback(
+                lambda task: self._finish_inflight(request_key, task)
+            )
+        
+        # Shield so one caller giving up doesn't cancel the generation for the others
+        answer, succeeded = await asyncio.shield(generation_task)
+        
+        if persistent_key and succeeded and owns_generation and (validate is None or validate(answer)):
+            await asyncio.to_thread(self.response_cache.set, persistent_key, cache, answer, cache_ttl)
+        
+        return answer
+    
+    async def _generate(self, request_body: Dict[str, Any]) -> Tuple[str, bool]:
+        """Run one generation end to end. Returns (answer, succeeded)."""
+        try:
+            # Step 1: Submit the generation request
+            generation_id, error = await self._submit_generation(request_body)
+            if error:
+                return error, False
+            
+            # Step 2: Poll for the results
+            generation_result = await self._poll_for_text_results(generation_id)
+            
+            # Step 3: Process and return the result
+            answer = self._format_result(generation_result)
+            return answer, not generation_result.get("error") and bool(generation_result.get("text"))
+            
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return f"Error calling AI Power Grid API: {str(e) or type(e).__name__}", False
+    
+    def _request_key(self, request_body: Dict[str, Any]) -> str:
+        """Hash a request payload so identical prompts and params share a key."""
+        payload = json.dumps(request_body, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _get_recent_result(self, request_key: str) -> Optional[str]:
+        """Get a recently finished answer for this request, if it hasn't expired."""
+        entry = self._recent_results.get(request_key)
+        if entry is None:
+            return None
+        
+        expires_at, answer = entry
+        if expires_at < time.monotonic():
+            del self._recent_results[request_key]
+            return None
+        
+        self._recent_results.move_to_end(request_key)
+        return answer
+    
+    def _finish_inflight(self, request_key: str, task: asyncio.Task):
+        """Stop sharing a finished generation and keep its answer briefly for repeats."""
+        self._inflight.pop(request_key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        
+        answer, succeeded = task.result()
+        if not succeeded or GRID_COALESCE_TTL <= 0:
+            return  # Errors are never reused
+        
+        self._recent_results[request_key] = (time.monotonic() + GRID_COALESCE_TTL, answer)
+        self._recent_results.move_to_end(request_key)
+        while len(self._recent_results) > GRID_COALESCE_MAX_ENTRIES:
+            self._recent_results.popitem(last=False)
+    
+    async def stream_answer(self, question: str, context: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """Yield the answer as it grows.
+        
+        Each item is the full text generated so far. Partial text is yielded
+        whenever the Grid exposes it in a status update; the last item is
+        always the final answer (or an error string, like get_answer).
+        """
+        if not GRID_API_KEY:
+            yield "Error: AI Power Grid API key not configured"
+            return
+        
+        request_body = self._build_request(self._build_prompt(question, context))
+        
+        try:
+            generation_id, error = await self._submit_generation(request_body)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            yield f"Error calling AI Power Grid API: {str(e) or type(e).__name__}"
+            return
+        if error:
+            yield error
+            return
+        
+        pending = self._track_generation(generation_id)
+        pending.partial_updates = asyncio.Queue()
+        last_text = ""
+        try:
+            while not pending.future.done():
+                next_update = asyncio.ensure_future(pending.partial_updates.get())
+                done, _ = await asyncio.wait({next_update, pending.future}, return_when=asyncio.FIRST_COMPLETED)
+                if next_update not in done:
+                    next_update.cancel()
+                    break
+                
+                text = self._normalize_api_text(next_update.result())
+                if text and text != last_text:
+                    last_text = text
+                    yield text
+            
+            final_text = self._format_result(pending.future.result())
+            if final_text != last_text:
+                yield final_text
+        finally:
+            # Consumer stopped early - stop tracking this generation
+            if not pending.future.done():
+                self._pending.pop(generation_id, None)
+    
+    def _build_prompt(self, question: str, context: List[Dict[str, Any]]) -> str:
+        """Build the full prompt from the question and retrieved context."""
         # Format context into a single string
         formatted_context = ""
         for i, item in enumerate(context):
@@ -40,7 +339,7 @@ class GridClient:
         
         # Create prompt with context and question
         if is_followup:
-            prompt = f"""
+            return f"""
 You are a helpful assistant answering questions about AI Power Grid.
 Use only the following context and previous conversation to answer the question. 
 If you don't know the answer based on the context, respond naturally like "not sure about that" or "can't find info on that" - be casual, not formal.
@@ -54,7 +353,7 @@ CONVERSATION HISTORY AND CURRENT QUESTION:
 ANSWER:
 """
         else:
-            prompt = f"""
+            return f"""
 You are a helpful assistant answering questions about AI Power Grid.
 Use only the following context to answer the question. If you don't know the answer based on the context, respond naturally like "not sure about that" or "can't find info on that" - be casual, not formal.
 
@@ -66,149 +365,264 @@ QUESTION:
 
 ANSWER:
 """
+    
+    def _build_request(self, prompt: str) -> Dict[str, Any]:
+        """Build the generation request payload for a prompt."""
+        # Prepare request payload based on example
+        return {
+            "prompt": prompt,
+            "params": {
+                "max_length": 1024,  # Maximum allowed by the API
+                "max_context_length": 8192,
+                "temperature": 0.7,
+                "rep_pen": 1.1,
+                "top_p": 0.92,
+                "top_k": 100,
+                "stop_sequence": ["<|endoftext|>"],  # Removed "\n\n" which was causing truncation
+            },
+            "models": [GRID_MODEL],  # Use model from environment variables
+        }
+    
+    async def _submit_generation(self, request_body: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        """Submit a generation request. Returns (generation_id, error_message)."""
+        # Print request details for debugging
+        print(f"Using API key: {GRID_API_KEY[:5]}...")
+        print(f"Using model: {GRID_MODEL}")
         
-        try:
-            # Prepare request payload based on example
-            request_body = {
-                "prompt": prompt,
-                "params": {
-                    "max_length": 1024,  # Maximum allowed by the API
-                    "max_context_length": 8192,
-                    "temperature": 0.7,
-                    "rep_pen": 1.1,
-                    "top_p": 0.92,
-                    "top_k": 100,
-                    "stop_sequence": ["<|endoftext|>"],  # Removed "\n\n" which was causing truncation
-                },
-                "models": [GRID_MODEL],  # Use model from environment variables
-            }
-            
-            # Set headers
-            headers = {
-                'Content-Type': 'application/json',
-                'apikey': GRID_API_KEY,
-                'Client-Agent': 'GridRAGBot:1.0'
-            }
-            
-            # Print request details for debugging
-            print(f"Using API key: {GRID_API_KEY[:5]}...")
-            print(f"Using model: {GRID_MODEL}")
-            
-            # Step 1: Submit the generation request
-            print("Sending request to API...")
-            response = requests.post(
-                TEXT_GENERATION_ENDPOINT,
-                headers=headers,
-                json=request_body
-            )
-            
+        print("Sending request to API...")
+        session = await self._get_session()
+        async with session.post(TEXT_GENERATION_ENDPOINT, json=request_body) as response:
             # Print response details for debugging
-            print(f"Response status code: {response.status_code}")
+            print(f"Response status code: {response.status}")
             
             # Check response - 202 is success for async operations
-            if response.status_code == 202:
+            if response.status == 202:
                 # This is the expected success code for async operations
-                result = response.json()
-            elif response.status_code != 200:
+                result = await response.json(content_type=None)
+            elif response.status != 200:
+                body = await response.text()
                 try:
-                    error_detail = response.json()
-                    return f"API Error ({response.status_code}): {json.dumps(error_detail)}"
-                except:
-                    return f"API Error ({response.status_code}): {response.text}"
+                    error_detail = json.loads(body)
+                    return None, f"API Error ({response.status}): {json.dumps(error_detail)}"
+                except ValueError:
+                    return None, f"API Error ({response.status}): {body}"
             else:
                 # Parse JSON response for 200 responses
-                result = response.json()
-            
-            # Get the generation ID
-            if not result or not result.get("id"):
-                return "Error: Failed to start text generation. No generation ID received."
-            
-            generation_id = result["id"]
-            print(f"Text generation request submitted with ID: {generation_id}")
-            
-            # Step 2: Poll for the results
-            generation_result = await self._poll_for_text_results(generation_id)
-            
-            # Step 3: Process and return the result
-            if generation_result.get("error"):
-                return f"Error: {generation_result['error']}"
-                
-            if not generation_result.get("text"):
-                return "Error: No text was generated"
-            
-            # Return the generated text
-            return self._normalize_api_text(generation_result["text"])
+                result = await response.json(content_type=None)
+        
+        # Get the generation ID
+        if not result or not result.get("id"):
+            return None, "Error: Failed to start text generation. No generation ID received."
+        
+        generation_id = result["id"]
+        print(f"Text generation request submitted with ID: {generation_id}")
+        return generation_id, None
+    
+    def _format_result(self, generation_result: Dict[str, Any]) -> str:
+        """Turn a final generation result into the text returned to callers."""
+        if generation_result.get("error"):
+            return f"Error: {generation_result['error']}"
             
-        except requests.RequestException as e:
-            return f"Error calling AI Power Grid API: {str(e)}"
+        if not generation_result.get("text"):
+            return "Error: No text was generated"
+        
+        # Return the generated text
+        return self._normalize_api_text(generation_result["text"])
     
-    async def _poll_for_text_results(self, generation_id, max_wait_time_seconds=120):
-        """Poll for text generation results."""
+    async def _poll_for_text_results(self, generation_id, max_wait_time_seconds=None):
+        """Wait for text generation results via the shared status poller."""
+        print(f"Starting to poll for text generation results for ID: {generation_id}")
+        pending = self._track_generation(generation_id, max_wait_time_seconds)
+        
         try:
-            print(f"Starting to poll for text generation results for ID: {generation_id}")
-            
-            # Keep track of polling attempts
-            attempts = 0
-            poll_interval_seconds = 3  # How often to poll in seconds
-            max_attempts = max_wait_time_seconds // poll_interval_seconds
-            
-            # Poll in a loop until max attempts reached
-            while attempts < max_attempts:
-                attempts += 1
-                print(f"Polling attempt {attempts}/{max_attempts} for text generation...")
+            return await pending.future
+        except asyncio.CancelledError:
+            # Caller went away - stop tracking this generation
+            self._pending.pop(generation_id, None)
+            raise
+    
+    def _track_generation(self, generation_id: str, max_wait_time_seconds=None) -> 'PendingGeneration':
+        """Register a generation with the shared status poller."""
+        pending = PendingGeneration(generation_id, PollSchedule(max_wait_time_seconds or GRID_POLL_DEADLINE))
+        # Give the Grid a moment to queue the job before the first check
+        pending.next_poll_at = time.monotonic() + pending.schedule.first_delay()
+        self._pending[generation_id] = pending
+        self._ensure_poller()
+        return pending
+    
+
+    def _ensure_poller(self):
+        """Start the background poller task if it isn't running, and wake it up."""
+        if self._poller_wakeup is None:
+            self._poller_wakeup = asyncio.Event()
+        if self._poller_task is None or self._poller_task.done():
+            self._poller_task = asyncio.get_running_loop().create_task(self._run_poller())
+        self._poller_wakeup.set()
+    
+    async def _run_poller(self):
+        """Poll every pending generation on one shared schedule until none are left."""
+        semaphore = asyncio.Semaphore(GRID_POLL_CONCURRENCY)
+        try:
+            while self._pending:
+                # Anything due within this tick is polled in the same round
+                round_end = time.monotonic() + GRID_POLL_TICK
+                due = [p for p in self._pending.values() if p.next_poll_at <= round_end]
+                if due:
+                    await asyncio.gather(*(self._poll_one(p, semaphore) for p in due))
                 
-                # Sleep between polling attempts to avoid rate limiting
-                if attempts > 1:
-                    import asyncio
-                    await asyncio.sleep(poll_interval_seconds)
+                self._poller_wakeup.clear()
+                if not self._pending:
+                    break
                 
+                # Sleep until the next generation is due or a new one registers
+                next_poll_at = min(p.next_poll_at for p in self._pending.values())
+                timeout = max(GRID_POLL_TICK, next_poll_at - time.monotonic())
+                try:
+                    await asyncio.wait_for(self._poller_wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except Exception as e:
+            # Don't leave callers hanging if the poller itself breaks
+            print(f"Status poller failed: {e}")
+            for pending in list(self._pending.values()):
+                self._resolve(pending, {"error": str(e), "done": False}, "error")
+    
+    async def _poll_one(self, pending: 'PendingGeneration', semaphore: asyncio.Semaphore):
+        """Check one generation's status and resolve or reschedule it."""
+        schedule = pending.schedule
+        async with semaphore:
+            if pending.future.done():
+                return
+            schedule.polls += 1
+            try:
                 # Make the API request to check the status
-                status_response = requests.get(
-                    f"{TEXT_GENERATION_STATUS_ENDPOINT}/{generation_id}", 
-                    headers={
-                        'apikey': GRID_API_KEY,
-                        'Client-Agent': 'GridRAGBot:1.0'
-                    }
-                )
-                
-                status_data = status_response.json()
+                session = await self._get_session()
+                async with session.get(f"{TEXT_GENERATION_STATUS_ENDPOINT}/{pending.generation_id}") as status_response:
+                    status_data = await status_response.json(content_type=None)
+            except Exception as e:
+                self._resolve(pending, {"error": str(e), "done": False}, "error")
+                return
+        
+        # A bad payload fails only this generation, not everything the poller is tracking
+        try:
+            if not isinstance(status_data, dict):
+                raise ValueError(f"unexpected status payload: {str(status_data)[:100]}")
+            self._handle_status(pending, status_data)
+        except Exception as e:
+            self._resolve(pending, {"error": f"Invalid status response: {e}", "done": False}, "error")
+    
+    def _handle_status(self, pending: 'PendingGeneration', status_data: Dict[str, Any]):
+        """Resolve or reschedule a generation from its status payload."""
+        schedule = pending.schedule
+        result = self._parse_status(status_data)
+        if result is not None:
+            if result.get("faulted"):
+                outcome = "faulted"
+            elif result.get("error"):
+                outcome = "error"
+            else:
+                outcome = "finished"
+            self._resolve(pending, result, outcome)
+            return
+        
+        # Forward any partial text to a streaming consumer
+        if pending.partial_updates is not None:
+            partial_text = self._partial_text(status_data)
+            if partial_text:
+                pending.partial_updates.put_nowait(partial_text)
+        
+        # Log progress metrics
+        waiting = status_data.get("waiting", 0)
+        processing = status_data.get("processing", 0)
+        finished = status_data.get("finished", 0)
+        print(f"Text generation {pending.generation_id} still in progress (poll {schedule.polls}): {waiting} waiting, {processing} processing, {finished} finished")
+        
+        delay = schedule.next_delay(status_data)
+        if delay is None:
+            # Deadline reached without a finished generation
+            self._resolve(
+                pending,
+                {"error": f"Polling timed out after {schedule.deadline_seconds:g} seconds", "done": False},
+                "timeout"
+            )
+        else:
+            pending.next_poll_at = time.monotonic() + delay
+    
+    def _resolve(self, pending: 'PendingGeneration', result: Dict[str, Any], outcome: str):
+        """Hand a final result to the waiting caller and stop tracking the generation."""
+        self._pending.pop(pending.generation_id, None)
+        if not pending.future.done():
+            pending.future.set_result(result)
+        self._record_poll_stats(pending.generation_id, pending.schedule, outcome)
+    
+
+    def _parse_status(self, status_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Turn a status payload into a final result, or None if still running."""
+        # Check if generation is complete
+        if status_data.get("done") == True:
+            print('Text generation completed successfully')
+            
+            # Check if we have valid generations
+            if status_data.get("generations") and len(status_data["generations"]) > 0:
+                generation = status_data["generations"][0]
                 
-                # Check if generation is complete
-                if status_data.get("done") == True:
-                    print('Text generation completed successfully')
-                    
-                    # Check if we have valid generations
-                    if status_data.get("generations") and len(status_data["generations"]) > 0:
-                        generation = status_data["generations"][0]
-                        
-                        # Make sure the generation has text
-                        if generation.get("text"):
-                            return {
-                                "text": generation["text"],
-                                "model": generation.get("model", "unknown"),
-                                "done": True
-                            }
-                        else:
-                            return {"error": "Generated text is empty", "done": True}
-                    else:
-                        return {"error": "No generations found", "done": True}
-                elif status_data.get("faulted") == True:
-                    # Check if generation failed
-                    fault_message = status_data.get("faulted_message", "Unknown error")
-                    return {"error": fault_message, "done": True, "faulted": True}
+                # Make sure the generation has text
+                if generation.get("text"):
+                    return {
+                        "text": generation["text"],
+                        "model": generation.get("model", "unknown"),
+                        "done": True
+                    }
                 else:
-                    # Log progress metrics
-                    waiting = status_data.get("waiting", 0)
-                    processing = status_data.get("processing", 0)
-                    finished = status_data.get("finished", 0)
-                    print(f"Text generation still in progress: {waiting} waiting, {processing} processing, {finished} finished")
-            
-            # If we've reached the maximum attempts, timeout
-            return {"error": f"Polling timed out after {max_wait_time_seconds} seconds", "done": False}
-            
-        except Exception as e:
-            return {"error": str(e), "done": False}
+                    return {"error": "Generated text is empty", "done": True}
+            else:
+                return {"error": "No generations found", "done": True}
+        elif status_data.get("faulted") == True:
+            # Check if generation failed
+            fault_message = status_data.get("faulted_message", "Unknown error")
+            return {"error": fault_message, "done": True, "faulted": True}
+        
+        return None
+    
+    def _partial_text(self, status_data: Dict[str, Any]) -> str:
+        """Extract text from an unfinished status payload, if the Grid exposes any."""
+        generations = status_data.get("generations") or []
+        if generations and isinstance(generations[0], dict):
+            return generations[0].get("text") or ""
+        return ""
+    
+    def _record_poll_stats(self, generation_id: str, schedule: 'PollSchedule', outcome: str):
+        """Remember how many polls a generation needed so the schedule can be tuned."""
+        elapsed = schedule.elapsed()
+        self.poll_stats.append({
+            "id": generation_id,
+            "polls": schedule.polls,
+            "elapsed": round(elapsed, 2),
+            "outcome": outcome
+        })
+        print(f"Generation {generation_id} {outcome} after {schedule.polls} poll(s) in {elapsed:.1f}s")
     
+    def get_poll_stats(self) -> Dict[str, Any]:
+        """Summarize poll counts and latency for recent generations."""
+        if not self.poll_stats:
+            return {"requests": 0}
+        
+        polls = [s["polls"] for s in self.poll_stats]
+        elapsed = [s["elapsed"] for s in self.poll_stats]
+        outcomes: Dict[str, int] = {}
+        for s in self.poll_stats:
+            outcomes[s["outcome"]] = outcomes.get(s["outcome"], 0) + 1
+        
+        return {
+            "requests": len(self.poll_stats),
+            "avg_polls": round(sum(polls) / len(polls), 2),
+            "max_polls": max(polls),
+            "avg_seconds": round(sum(elapsed) / len(elapsed), 2),
+            "max_seconds": max(elapsed),
+            "outcomes": outcomes
+        }
+    
+
     def _normalize_api_text(self, text):
         """Normalize text from AI Power Grid API responses."""
         if not text:
@@ -86,11 +86,11 @@ def main():
             return 1
         
         print(f"Ingesting files from directory: {args.dir}")
-        count = 0
         
         # Get absolute path of docs directory to avoid trying to ingest it again
         docs_dir = os.path.abspath('docs')
         
+        file_paths = []
         for filename in os.listdir(args.dir):
             file_path = os.path.join(args.dir, filename)
             
@@ -99,16 +99,16 @@ def main():
                 continue
                 
             if os.path.isfile(file_path):
-                try:
-                    # Create a unique ID for the document to avoid conflicts
-                    file_id = os.path.basename(file_path)
-                    result = retriever.ingest_file(file_path)
-                    print(result)
-                    count += 1
-                except Exception as e:
-                    print(f"Error ingesting {file_path}: {str(e)}")
+                file_paths.append(file_path)
         
-        print(f"Ingested {count} files from {args.dir}")
+        # Files are read, chunked and embedded in parallel batches
+        changes = retriever.ingest_files(file_paths)
+        for filename in changes["failed"]:
+            print(f"Error ingesting {filename}")
+        
+        count = len(changes["added"]) + len(changes["updated"]) + len(changes["unchanged"])
+        print(f"Ingested {count} files from {args.dir} ({len(changes['added'])} new, "
+              f"{len(changes['updated'])} updated, {len(changes['unchanged'])} unchanged)")
     
     # Ingest from GitHub repo
     if args.github:
@@ -0,0 +1,161 @@
+"""
+Async OpenGraph link previews.
+Streams only the <head> of each page, parses meta tags with the stdlib HTML
+tokenizer, fetches URLs in parallel and caches previews (and failures) by URL.
+"""
+import os
+import re
+import time
+import codecs
+import asyncio
+import aiohttp
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+LINK_PREVIEW_TIMEOUT = float(os.getenv('LINK_PREVIEW_TIMEOUT', '4'))  # total seconds per fetch
+LINK_PREVIEW_MAX_BYTES = int(os.getenv('LINK_PREVIEW_MAX_BYTES', '65536'))  # stop reading a page after this many bytes
+LINK_PREVIEW_CACHE_TTL = int(os.getenv('LINK_PREVIEW_CACHE_TTL', '3600'))  # seconds a preview is reused
+LINK_PREVIEW_NEGATIVE_TTL = int(os.getenv('LINK_PREVIEW_NEGATIVE_TTL', '600'))  # seconds a failed fetch is remembered
+LINK_PREVIEW_CACHE_MAX_ENTRIES = 1000
+MAX_PREVIEW_URLS = 3  # Limit URLs per message to avoid slowdown
+
+OG_PROPERTIES = ('og:title', 'og:description', 'og:site_name', 'twitter:title', 'twitter:description')
+PREVIEW_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (compatible; Discordbot/2.0; +https://discordapp.com)'
+}
+
+class _HeadMetaParser(HTMLParser):
+    """Collects OpenGraph/Twitter meta tags and notes when the <head> ends."""
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.og_data: Dict[str, str] = {}
+        self.head_done = False
+    
+    def handle_starttag(self, tag, attrs):
+        if tag == 'meta':
+            attributes = dict(attrs)
+            prop = attributes.get('property') or attributes.get('name') or ''
+            if prop in OG_PROPERTIES and prop not in self.og_data:
+                self.og_data[prop] = (attributes.get('content') or '')[:500]  # Limit length
+        elif tag == 'body':
+            self.head_done = True
+    
+    def handle_endtag(self, tag):
+        if tag == 'head':
+            self.head_done = True
+
+class LinkPreviewService:
+    """Fetches and caches OpenGraph metadata for URLs."""
+    
+    def __init__(self):
+        """Initialize the preview service."""
+        # Created lazily so it binds to the running event loop
+        self._session: Optional[aiohttp.ClientSession] = None
+        # url -> (expires_at, og_data); an empty dict is a cached failure
+        self._cache: 'OrderedDict[str, Tuple[float, Dict[str, str]]]' = OrderedDict()
+        # url -> running fetch, so concurrent callers share it
+        self._inflight: Dict[str, asyncio.Task] = {}
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared HTTP session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=LINK_PREVIEW_TIMEOUT),
+                headers=PREVIEW_HEADERS
+            )
+        return self._session
+    
+    async def close(self):
+        """Close the shared HTTP session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def get_preview(self, url: str) -> Dict[str, str]:
+        """Get OpenGraph metadata for a URL ({} if none is available)."""
+        cached = self._cache.get(url)
+        if cached is not None:
+            expires_at, og_data = cached
+            if expires_at >= time.monotonic():
+                self._cache.move_to_end(url)
+                return og_data
+            del self._cache[url]
+        
+        fetch_task = self._inflight.get(url)
+        if fetch_task is None:
+            fetch_task = asyncio.get_running_loop().create_task(self._fetch(url))
+            self._inflight[url] = fetch_task
+            fetch_task.add_done_callback(lambda task: self._store(url, task))
+        return await asyncio.shield(fetch_task)
+    
+    async def get_previews(self, urls: List[str]) -> List[Tuple[str, Dict[str, str]]]:
+        """Fetch previews for several URLs in parallel."""
+        urls = urls[:MAX_PREVIEW_URLS]
+        previews = await asyncio.gather(*(self.get_preview(url) for url in urls))
+        return list(zip(urls, previews))
+    
+    async def format_link_context(self, urls: List[str]) -> str:
+        """Extract and format OpenGraph data for all URLs in a message."""
+        if not urls:
+            return ""
+        
+        link_info = []
+        for url, og in await self.get_previews(urls):
+            if og:
+                title = og.get('og:title') or og.get('twitter:title', '')
+                desc = og.get('og:description') or og.get('twitter:description', '')
+                site = og.get('og:site_name', '')
+                
+                info = f"Link: {url}"
+                if site:
+                    info += f"\n  Site: {site}"
+                if title:
+                    info += f"\n  Title: {title}"
+                if desc:
+                    info += f"\n  Description: {desc[:200]}..."
+                link_info.append(info)
+            else:
+                link_info.append(f"Link: {url} (no preview available)")
+        
+        if link_info:
+            return "\n\n=== LINK PREVIEWS ===\n" + "\n\n".join(link_info)
+        return ""
+    
+    async def _fetch(self, url: str) -> Dict[str, str]:
+        """Stream a page's <head> and parse its OpenGraph tags."""
+        fetch_url = url if re.match(r'^https?://', url, re.IGNORECASE) else f"https://{url}"
+        try:
+            session = await self._get_session()
+            async with session.get(fetch_url, allow_redirects=True) as resp:
+                if resp.status != 200 or 'html' not in resp.headers.get('Content-Type', 'text/html').lower():
+                    return {}
+                
+                decoder = codecs.getincrementaldecoder(resp.charset or 'utf-8')(errors='replace')
+                parser = _HeadMetaParser()
+                bytes_read = 0
+                async for chunk in resp.content.iter_chunked(8192):
+                    bytes_read += len(chunk)
+                    parser.feed(decoder.decode(chunk))
+                    # Everything we need lives in <head>; skip the rest of the page
+                    if parser.head_done or bytes_read >= LINK_PREVIEW_MAX_BYTES:
+                        break
+                
+                return parser.og_data
+        except Exception as e:
+            print(f"OpenGraph extraction failed for {url}: {e}")
+            return {}
+    
+    def _store(self, url: str, task: asyncio.Task):
+        """Cache a finished fetch; failures are cached for a shorter time."""
+        self._inflight.pop(url, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        
+        og_data = task.result()
+        ttl = LINK_PREVIEW_CACHE_TTL if og_data else LINK_PREVIEW_NEGATIVE_TTL
+        self._cache[url] = (time.monotonic() + ttl, og_data)
+        self._cache.move_to_end(url)
+        while len(self._cache) > LINK_PREVIEW_CACHE_MAX_ENTRIES:
+            self._cache.popitem(last=False)
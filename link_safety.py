@@ -0,0 +1,171 @@
+"""
+Fast URL screening for scam detection.
+Resolves link domains against trusted and blocked sets before any LLM call,
+and remembers verdicts so repeat links skip the Grid entirely. Scam verdicts
+apply to the whole domain; safe verdicts only to the exact URL.
+"""
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Official and well-known domains - the domain itself and any subdomain are trusted
+TRUSTED_DOMAINS = frozenset([
+    # AI Power Grid
+    'aipowergrid.io',
+    # Block explorers
+    'etherscan.io', 'polygonscan.com', 'basescan.org', 'bscscan.com', 'arbiscan.io', 'snowtrace.io', 'ftmscan.com',
+    # Price trackers
+    'coingecko.com', 'coinmarketcap.com', 'coinpaprika.com', 'livecoinwatch.com',
+    # DEXes
+    'uniswap.org', 'pancakeswap.finance', 'aerodrome.finance', 'curve.fi', 'balancer.fi', 'sushi.com', '1inch.io',
+    # L2/Superchain
+    'base.org', 'optimism.io', 'arbitrum.io', 'zksync.io',
+    # Crypto tools
+    'dextools.io', 'dexscreener.com', 'defined.fi',
+    # Social
+    'github.com', 'twitter.com', 'x.com', 'medium.com', 'reddit.com', 'youtube.com', 'youtu.be',
+])
+
+# Server invites are never allowed
+BLOCKED_DOMAINS = frozenset(['discord.gg'])
+BLOCKED_URL_PATTERN = re.compile(r'(?:^|[/.])discord(?:app)?\.com/invite(?:/|$)', re.IGNORECASE)
+DISCORD_INVITE_MARKERS = ('discord.gg', 'discord.com/invite', 'discordapp.com/invite')
+
+# Shorteners and shared hosting - one link says nothing about the rest of the host,
+# so verdicts here are only ever cached per URL
+SHARED_HOST_DOMAINS = frozenset([
+    # Shorteners and link pages
+    'bit.ly', 'tinyurl.com', 't.co', 'goo.gl', 'ow.ly', 'is.gd', 'buff.ly', 'rebrand.ly', 'cutt.ly', 'shorturl.at',
+    'linktr.ee',
+    # Shared documents and file hosting
+    'docs.google.com', 'drive.google.com', 'sites.google.com', 'forms.gle', 'dropbox.com', 'mega.nz',
+    'cdn.discordapp.com', 'media.discordapp.net',
+    # Free site hosting
+    'github.io', 'gitbook.io', 'notion.site', 'vercel.app', 'netlify.app', 'pages.dev', 'web.app',
+    'firebaseapp.com', 'herokuapp.com', 'wixsite.com', 'weebly.com', 'blogspot.com',
+])
+
+DOMAIN_VERDICT_TTL = int(os.getenv('DOMAIN_VERDICT_TTL', str(24 * 3600)))  # seconds an LLM verdict is reused
+DOMAIN_VERDICT_MAX_ENTRIES = 5000
+
+# domain or normalized URL -> (expires_at, is_scam, reason)
+_link_verdicts: 'OrderedDict[str, Tuple[float, bool, str]]' = OrderedDict()
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL for comparison: lowercase scheme and host, no trailing slash or fragment."""
+    url = url.strip().rstrip('.,;:!?\'"')
+    if not re.match(r'^[a-z][a-z0-9+.-]*://', url, re.IGNORECASE):
+        url = 'https://' + url
+    parsed = urlsplit(url)
+    path = parsed.path.rstrip('/')
+    query = f"?{parsed.query}" if parsed.query else ""
+    return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{path}{query}"
+
+def extract_domain(url: str) -> str:
+    """Get the lowercase host of a URL (scheme optional)."""
+    url = url.strip()
+    if not re.match(r'^[a-z][a-z0-9+.-]*://', url, re.IGNORECASE):
+        url = 'https://' + url
+    try:
+        return (urlsplit(url).hostname or '').rstrip('.').lower()
+    except ValueError:
+        return ''
+
+def _matches_domain_set(domain: str, domains: frozenset) -> bool:
+    """Check a domain and each of its parent domains against a set."""
+    parts = domain.split('.')
+    return any('.'.join(parts[i:]) in domains for i in range(len(parts) - 1))
+
+def is_discord_invite(text: str) -> bool:
+    """Check for Discord invite links, including ones the URL extractor missed."""
+    text = text.lower()
+    return any(marker in text for marker in DISCORD_INVITE_MARKERS)
+
+def classify_url(url: str) -> str:
+    """Classify a single URL as 'blocked', 'trusted' or 'unknown' without any LLM call."""
+    domain = extract_domain(url)
+    if not domain:
+        return 'unknown'
+    if _matches_domain_set(domain, BLOCKED_DOMAINS) or BLOCKED_URL_PATTERN.search(url):
+        return 'blocked'
+    if _matches_domain_set(domain, TRUSTED_DOMAINS):
+        return 'trusted'
+    return 'unknown'
+
+def is_shared_host(domain: str) -> bool:
+    """Check whether a domain hosts links from many unrelated people."""
+    return _matches_domain_set(domain, SHARED_HOST_DOMAINS)
+
+def get_link_verdict(url: str) -> Optional[Tuple[bool, str]]:
+    """Get a cached (is_scam, reason) verdict for a URL or its domain, if still fresh."""
+    domain = extract_domain(url)
+    for key in (normalize_url(url), domain):
+        entry = _link_verdicts.get(key)
+        if entry is None:
+            continue
+        
+        expires_at, is_scam, reason = entry
+        if expires_at < time.monotonic():
+            del _link_verdicts[key]
+            continue
+        
+        _link_verdicts.move_to_end(key)
+        return is_scam, reason
+    return None
+
+def record_link_verdict(urls: List[str], is_scam: bool, reason: str):
+    """Cache an LLM verdict for the unknown links it covered.
+    
+    A safe verdict is remembered for each exact URL. A scam verdict is
+    remembered for the whole domain when exactly one unknown domain was
+    involved (per URL on shared hosts, where one bad link doesn't condemn the rest).
+    """
+    unknown_urls = [url for url in urls if classify_url(url) == 'unknown' and extract_domain(url)]
+    if not is_scam:
+        keys = {normalize_url(url) for url in unknown_urls}
+    else:
+        unknown_domains = {extract_domain(url) for url in unknown_urls}
+        if len(unknown_domains) != 1:
+            return  # The verdict can't be attributed to a single domain
+        domain = unknown_domains.pop()
+        if not is_shared_host(domain):
+            keys = {domain}
+        elif len(unknown_urls) == 1:
+            keys = {normalize_url(unknown_urls[0])}
+        else:
+            return
+    
+    expires_at = time.monotonic() + DOMAIN_VERDICT_TTL
+    for key in keys:
+        _link_verdicts[key] = (expires_at, is_scam, reason)
+        _link_verdicts.move_to_end(key)
+    while len(_link_verdicts) > DOMAIN_VERDICT_MAX_ENTRIES:
+        _link_verdicts.popitem(last=False)
+
+def screen_urls(urls: List[str]) -> Tuple[Optional[Tuple[bool, str]], List[str]]:
+    """Screen URLs before the LLM.
+    
+    Returns (verdict, unknown_urls). `verdict` is an (is_scam, reason) tuple
+    when the links can be decided without the LLM; otherwise it is None and
+    `unknown_urls` lists the links that still need analysis.
+    """
+    unknown_urls = []
+    for url in urls:
+        classification = classify_url(url)
+        if classification == 'blocked':
+            return (True, "Discord invite link"), []
+        if classification == 'trusted':
+            continue
+        
+        cached = get_link_verdict(url)
+        if cached is None:
+            unknown_urls.append(url)
+        elif cached[0]:
+            return (True, f"{cached[1]} (known link)"), []
+    
+    if not unknown_urls:
+        return (False, "trusted or previously verified links only"), []
+    return None, unknown_urls
@@ -1,12 +1,21 @@
 import os
 import sys
 import shutil
+import argparse
 import chromadb
 from dotenv import load_dotenv
 from retriever import DocumentRetriever
 
 def main():
     """Rebuild the ChromaDB index from all documents in the docs directory."""
+    parser = argparse.ArgumentParser(description="Sync or rebuild the document index from docs/")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Wipe the index and re-embed every document instead of only new and changed ones"
+    )
+    args = parser.parse_args()
+    
     print("Starting index rebuild process...")
     
     # Load environment variables
@@ -28,36 +37,39 @@ def main():
     
     print(f"Found {len(doc_files)} documents in 'docs' directory.")
     
-    # Backup the existing ChromaDB (if any)
-    if os.path.exists(CHROMA_DB_PATH):
-        backup_path = f"{CHROMA_DB_PATH}_backup"
-        print(f"Backing up existing ChromaDB to {backup_path}")
-        if os.path.exists(backup_path):
-            shutil.rmtree(backup_path)
-        shutil.copytree(CHROMA_DB_PATH, backup_path)
+    if args.full:
+        # Backup the existing ChromaDB (if any)
+        if os.path.exists(CHROMA_DB_PATH):
+            backup_path = f"{CHROMA_DB_PATH}_backup"
+            print(f"Backing up existing ChromaDB to {backup_path}")
+            if os.path.exists(backup_path):
+                shutil.rmtree(backup_path)
+            shutil.copytree(CHROMA_DB_PATH, backup_path)
+            
+            # Delete the existing ChromaDB
+            print("Deleting existing ChromaDB collection...")
+            try:
+                shutil.rmtree(CHROMA_DB_PATH)
+            except Exception as e:
+                print(f"Error deleting ChromaDB: {str(e)}")
+                return 1
         
-        # Delete the existing ChromaDB
-        print("Deleting existing ChromaDB collection...")
-        try:
-            shutil.rmtree(CHROMA_DB_PATH)
-        except Exception as e:
-            print(f"Error deleting ChromaDB: {str(e)}")
-            return 1
+        # Create a new retriever (which will initialize a new ChromaDB)
+        print("Creating new ChromaDB collection...")
     
-    # Create a new retriever (which will initialize a new ChromaDB)
-    print("Creating new ChromaDB collection...")
     retriever = DocumentRetriever()
     
-    # Ingest all documents
-    print("Ingesting documents...")
-    for filename in doc_files:
-        file_path = os.path.join('docs', filename)
-        try:
-            print(f"Ingesting {filename}...")
-            result = retriever.ingest_file(file_path)
-            print(f"  {result}")
-        except Exception as e:
-            print(f"  Error ingesting {filename}: {str(e)}")
+    # Only new and changed files are re-embedded; after a wipe that's all of them
+    print("Syncing index with 'docs' directory...")
+    changes = retriever.sync_documents()
+    for status in ("added", "updated", "removed", "failed"):
+        for filename in changes[status]:
+            print(f"  {status.capitalize()}: {filename}")
+    print(f"Sync complete: {len(changes['added'])} added, {len(changes['updated'])} updated, "
+          f"{len(changes['unchanged'])} unchanged, {len(changes['removed'])} removed, "
+          f"{len(changes['failed'])} failed")
+    if changes["failed"]:
+        return 1
     
     print("Index rebuild complete!")
     return 0
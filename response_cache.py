@@ -0,0 +1,122 @@
+"""
+Persistent cache for deterministic LLM helper prompts.
+Uses SQLite so cached responses survive restarts. Entries expire by TTL and
+the least recently used rows are evicted once the cache is full.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'llm_cache.db')
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))
+
+# TTL in seconds per call site. Call sites not listed here are never cached,
+# which keeps the main conversational prompt out of the cache.
+CACHE_TTLS = {
+    'scam_verdict': int(os.getenv('LLM_CACHE_TTL_SCAM_VERDICT', str(24 * 3600))),
+    'memory_key': int(os.getenv('LLM_CACHE_TTL_MEMORY_KEY', str(7 * 24 * 3600))),
+}
+
+class ResponseCache:
+    """SQLite-backed LLM response cache with TTL expiry and LRU eviction."""
+    
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        """Open (or create) the cache database."""
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        
+        # Hit/miss counters per call site
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    call_site TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)")
+            self._conn.commit()
+    
+    @staticmethod
+    def make_key(prompt: str, model: str, params: Dict[str, Any]) -> str:
+        """Hash the prompt, model and generation params into a cache key."""
+        payload = json.dumps({"prompt": prompt, "model": model, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str, call_site: str) -> Optional[str]:
+        """Get a cached response, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row is None or row[1] < now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses[call_site] = self.misses.get(call_site, 0) + 1
+                return None
+            
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits[call_site] = self.hits.get(call_site, 0) + 1
+            return row[0]
+    
+    def set(self, key: str, call_site: str, response: str, ttl: float):
+        """Store a response and evict the least recently used rows if over capacity."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO llm_cache (key, call_site, response, created_at, expires_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    response = excluded.response,
+                    created_at = excluded.created_at,
+                    expires_at = excluded.expires_at,
+                    last_used = excluded.last_used
+            """, (key, call_site, response, now, now + ttl, now))
+            
+            count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if count > self.max_entries:
+                # Drop expired rows first, then the least recently used
+                self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+                self._conn.execute("""
+                    DELETE FROM llm_cache WHERE key IN (
+                        SELECT key FROM llm_cache ORDER BY last_used ASC
+                        LIMIT MAX(0, (SELECT COUNT(*) FROM llm_cache) - ?)
+                    )
+                """, (self.max_entries,))
+            
+            self._conn.commit()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters per call site and the current entry count."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        
+        call_sites = sorted(set(self.hits) | set(self.misses))
+        return {
+            "entries": entries,
+            "call_sites": {
+                site: {"hits": self.hits.get(site, 0), "misses": self.misses.get(site, 0)}
+                for site in call_sites
+            }
+        }
+    
+    def close(self):
+        """Close the cache database."""
+        with self._lock:
+            self._conn.close()
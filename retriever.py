@@ -1,6 +1,15 @@
 import os
+import json
+import time
+import hashlib
 import shutil
-from typing import List, Dict, Any
+import asyncio
+import datetime
+import threading
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Callable, Optional, Tuple
 import requests
 from dotenv import load_dotenv
 from llama_index.core import (
@@ -10,8 +19,12 @@ from llama_index.core import (
     StorageContext,
     Settings
 )
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
 import chromadb
 from chromadb.errors import NotFoundError
+from conversation_db import get_messages_since
+from embedding_cache import EmbeddingCache, normalize_query
 
 # Import ChromaVectorStore from the right package
 from llama_index.vector_stores.chroma import ChromaVectorStore
@@ -30,6 +43,36 @@ except ImportError:
 load_dotenv()
 CHROMA_DB_PATH = os.getenv('CHROMA_DB_PATH', './chroma_db')
 
+# Maps each file in docs/ to its content hash and the ids of its nodes in the discord_docs collection
+DOC_MANIFEST_PATH = os.path.join(CHROMA_DB_PATH, 'doc_manifest.json')
+LEGACY_SCAN_PAGE_SIZE = 5000  # vectors read per page when looking for ones that predate the manifest
+
+# Bulk ingestion: files are read and chunked in parallel, then embedded and written in fixed-size batches
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '4'))  # threads reading and chunking files
+INGEST_EMBED_BATCH_SIZE = int(os.getenv('INGEST_EMBED_BATCH_SIZE', '64'))  # chunks embedded and upserted per batch
+
+# Conversation history retrieval
+CHAT_COLLECTION = "discord_chat"
+CHAT_INDEX_STATE_PATH = os.path.join(CHROMA_DB_PATH, 'chat_index_state.json')
+CHAT_WINDOW_MESSAGES = int(os.getenv('CHAT_WINDOW_MESSAGES', '8'))  # max messages per indexed conversation window
+CHAT_WINDOW_GAP_MINUTES = int(os.getenv('CHAT_WINDOW_GAP_MINUTES', '15'))  # silence that ends a window
+CHAT_EMBED_BATCH_SIZE = int(os.getenv('CHAT_EMBED_BATCH_SIZE', '32'))  # windows embedded per batch
+CHAT_MIN_WINDOW_CHARS = 40  # shorter windows aren't worth indexing
+CHAT_FETCH_LIMIT = 2000  # messages read from SQLite per indexing pass
+
+# Async retrieval: concurrent queries are collected briefly and embedded/searched together
+RETRIEVAL_WORKERS = int(os.getenv('RETRIEVAL_WORKERS', '2'))  # threads running embedding + vector search
+RETRIEVAL_BATCH_WINDOW_MS = int(os.getenv('RETRIEVAL_BATCH_WINDOW_MS', '15'))  # how long a query waits for companions
+RETRIEVAL_MAX_BATCH = int(os.getenv('RETRIEVAL_MAX_BATCH', '16'))  # queries per embedding forward pass
+
+# Retrieval results are reused until the index changes (or the TTL passes, for changes made by other processes)
+RETRIEVAL_CACHE_SIZE = int(os.getenv('RETRIEVAL_CACHE_SIZE', '512'))
+RETRIEVAL_CACHE_TTL = int(os.getenv('RETRIEVAL_CACHE_TTL', '600'))  # seconds
+
+def _message_time(message: Dict[str, Any]) -> datetime.datetime:
+    """Parse a stored message's timestamp."""
+    return datetime.datetime.fromisoformat(message['timestamp'])
+
 class DocumentRetriever:
     """Class to handle document ingestion and retrieval."""
     
@@ -41,10 +84,17 @@ class DocumentRetriever:
         # Configure embedding model first
         # Use HuggingFace embeddings for better results
         self.embedding_dim = 384  # Default for BAAI/bge-small-en-v1.5
+        self.embed_model = None  # Set when a real embedding model is available
         
         if HuggingFaceEmbedding is not None:
             try:
-                Settings.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
+                # Large enough that each ingestion/chat batch is a single forward pass
+                # (get_text_embedding_batch re-splits its input by embed_batch_size)
+                Settings.embed_model = HuggingFaceEmbedding(
+                    model_name="BAAI/bge-small-en-v1.5",
+                    embed_batch_size=max(INGEST_EMBED_BATCH_SIZE, CHAT_EMBED_BATCH_SIZE)
+                )
+                self.embed_model = Settings.embed_model
                 print("Using HuggingFace embeddings")
             except Exception as e:
                 print(f"Failed to load HuggingFace embeddings: {str(e)}")
@@ -71,6 +121,31 @@ class DocumentRetriever:
                 metadata={"hnsw:space": "cosine"}  # Use cosine similarity
             )
         
+        # Conversation windows from stored chat history live in their own collection
+        self.chat_collection = self.chroma_client.get_or_create_collection(
+            name=CHAT_COLLECTION,
+            metadata={"hnsw:space": "cosine"}
+        )
+        self._chat_index_lock = threading.Lock()
+        
+        # Async retrieval runs off the event loop on its own pool, in micro-batches
+        self._retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix='retrieval')
+        self._pending_queries: List[Tuple[str, int, asyncio.Future]] = []
+        self._batch_handle: Optional[asyncio.Handle] = None
+        
+        # Query embeddings and retrieval results are cached; bumping index_version invalidates results
+        self.embedding_cache = EmbeddingCache(model_name=getattr(Settings.embed_model, 'model_name', '') or '')
+        self.index_version = 0
+        self._result_cache: 'OrderedDict[Tuple[str, int, int], Tuple[float, List[Dict[str, Any]]]]' = OrderedDict()
+        self._result_cache_lock = threading.Lock()
+        
+        # Node ids per source file, so a document's vectors can be removed on their own
+        self._manifest_lock = threading.Lock()
+        self.doc_manifest = self._load_manifest()
+        # Vectors written before the manifest existed, grouped by the docs/ file they came from (built on first use)
+        self._legacy_vectors: Optional[Dict[str, List[str]]] = None
+        self._legacy_lock = threading.Lock()
+        
         # Create vector store
         self.vector_store = ChromaVectorStore(chroma_collection=self.chroma_collection)
         
@@ -101,17 +176,318 @@ class DocumentRetriever:
         if not os.path.exists('docs') or len(os.listdir('docs')) == 0:
             return None
             
-        # Load documents
+        # Load documents and split them into nodes
         documents = SimpleDirectoryReader('docs').load_data()
+        nodes = Settings.node_parser.get_nodes_from_documents(documents)
         
         # Create index
-        index = VectorStoreIndex.from_documents(
-            documents,
-            storage_context=self.storage_context
-        )
+        index = VectorStoreIndex(nodes, storage_context=self.storage_context)
+        
+        documents_by_file: Dict[str, List[Document]] = {}
+        for document in documents:
+            documents_by_file.setdefault(document.metadata.get("file_name", ""), []).append(document)
+        node_ids: Dict[str, List[str]] = {}
+        for node in nodes:
+            node_ids.setdefault(node.metadata.get("file_name", ""), []).append(node.node_id)
+        with self._manifest_lock:
+            self.doc_manifest = {
+                filename: {"hash": self._content_hash(documents_by_file.get(filename, [])), "node_ids": ids}
+                for filename, ids in node_ids.items() if filename
+            }
+            self._save_manifest()
         
         return index
     
+    def _content_hash(self, documents: List[Document]) -> str:
+        """Hash the text of a file's documents to detect changes."""
+        return hashlib.sha256("\0".join(document.text for document in documents).encode('utf-8')).hexdigest()
+    
+    def _index_documents(self, filename: str, documents: List[Document]) -> str:
+        """Chunk documents from one docs/ file into the index, replacing any older version.
+        
+        Returns 'unchanged' if the content matches what is already indexed,
+        otherwise 'added' or 'updated'.
+        """
+        content_hash = self._content_hash(documents)
+        with self._manifest_lock:
+            entry = self.doc_manifest.get(filename)
+        if entry and entry.get("hash") == content_hash:
+            return "unchanged"
+        
+        if entry is None:
+            # Clear vectors from before the manifest existed so they aren't duplicated
+            self._delete_untracked_vectors(filename)
+        
+        for document in documents:
+            document.metadata.setdefault("file_name", filename)
+        nodes = Settings.node_parser.get_nodes_from_documents(documents)
+        
+        if self.index is None:
+            self.index = VectorStoreIndex(nodes, storage_context=self.storage_context)
+        else:
+            self.index.insert_nodes(nodes)
+        
+        with self._manifest_lock:
+            self.doc_manifest[filename] = {"hash": content_hash, "node_ids": [node.node_id for node in nodes]}
+            self._save_manifest()
+        
+        # The new version is live; now drop the old one
+        if entry and entry.get("node_ids"):
+            self.chroma_collection.delete(ids=entry["node_ids"])
+        
+        return "updated" if entry else "added"
+    
+    def _remove_document_vectors(self, filename: str):
+        """Delete a document's vectors and forget it in the manifest."""
+        with self._manifest_lock:
+            entry = self.doc_manifest.get(filename)
+            if entry and entry.get("node_ids"):
+                self.chroma_collection.delete(ids=entry["node_ids"])
+            else:
+                self._delete_untracked_vectors(filename)
+            
+            self.doc_manifest.pop(filename, None)
+            self._save_manifest()
+    
+    def _delete_untracked_vectors(self, filename: str):
+        """Delete vectors for a file ingested before node ids were tracked."""
+        with self._legacy_lock:
+            ids = self._load_legacy_vectors().pop(filename, [])
+        if ids:
+            self.chroma_collection.delete(ids=ids)
+    
+    def _load_legacy_vectors(self) -> Dict[str, List[str]]:
+        """Get the legacy vector map, scanning the collection the first time (caller holds the legacy lock)."""
+        if self._legacy_vectors is None:
+            self._legacy_vectors = self._scan_legacy_vectors()
+        return self._legacy_vectors
+    
+    def _scan_legacy_vectors(self) -> Dict[str, List[str]]:
+        """Group the ids of vectors missing from the manifest by the docs/ file they were ingested as."""
+        tracked = set()
+        for entry in list(self.doc_manifest.values()):
+            tracked.update(entry.get("node_ids", []))
+        
+        legacy: Dict[str, List[str]] = {}
+        offset = 0
+        while True:
+            page = self.chroma_collection.get(include=["metadatas"], limit=LEGACY_SCAN_PAGE_SIZE, offset=offset)
+            for node_id, metadata in zip(page["ids"], page["metadatas"]):
+                if node_id not in tracked:
+                    filename = self._legacy_file_name(metadata or {})
+                    if filename:
+                        legacy.setdefault(filename, []).append(node_id)
+            if len(page["ids"]) < LEGACY_SCAN_PAGE_SIZE:
+                return legacy
+            offset += LEGACY_SCAN_PAGE_SIZE
+    
+    def _legacy_file_name(self, metadata: Dict[str, Any]) -> str:
+        """Work out which docs/ file an old vector came from, the way each ingest path named it."""
+        if metadata.get("file_name"):
+            return metadata["file_name"]
+        if metadata.get("repo") and metadata.get("github_path"):
+            # ingest_from_github_repo: github_<owner>_<repo>_<path with separators replaced>
+            safe_path = metadata["github_path"].replace("/", "_").replace("\\", "_")
+            return f"github_{metadata['repo'].replace('/', '_')}_{safe_path}"
+        source = metadata.get("source", "")
+        if source.startswith(("http://", "https://")):
+            # ingest_from_url: the last path segment
+            return source.split('/')[-1]
+        return source  # ingest_content stored the filename itself
+    
+    def sync_documents(self) -> Dict[str, List[str]]:
+        """Bring the index in line with docs/.
+        
+        New and changed files are embedded, unchanged ones are skipped and
+        files that no longer exist are removed. Returns the filenames in each
+        category ('added', 'updated', 'unchanged', 'removed', 'failed').
+        """
+        changes: Dict[str, List[str]] = {"added": [], "updated": [], "unchanged": [], "removed": [], "failed": []}
+        filenames = sorted(
+            f for f in os.listdir('docs')
+            if os.path.isfile(os.path.join('docs', f)) and not f.startswith('.') and f != 'README.md'
+        )
+        
+        changes.update(self.ingest_documents(
+            [(filename, functools.partial(self._read_file, os.path.join('docs', filename))) for filename in filenames]
+        ))
+        
+        with self._manifest_lock:
+            stale = [filename for filename in self.doc_manifest if filename not in filenames]
+        for filename in stale:
+            self._remove_document_vectors(filename)
+            changes["removed"].append(filename)
+        
+        if changes["removed"]:
+            self._bump_index_version()
+        return changes
+    
+    def ingest_files(self, file_paths: List[str]) -> Dict[str, List[str]]:
+        """Copy files into docs/ (if they aren't there already) and bulk-ingest them."""
+        sources = []
+        for file_path in file_paths:
+            if os.path.dirname(os.path.abspath(file_path)) == os.path.abspath('docs'):
+                doc_path = file_path
+            else:
+                doc_path = os.path.join('docs', os.path.basename(file_path))
+                shutil.copy2(file_path, doc_path)
+            sources.append((os.path.basename(doc_path), functools.partial(self._read_file, doc_path)))
+        return self.ingest_documents(sources)
+    
+    def ingest_documents(self, sources: List[Tuple[str, Callable[[], List[Document]]]]) -> Dict[str, List[str]]:
+        """Bulk-ingest many docs/ files.
+        
+        Each source is a (filename, load) pair; `load` returns the file's
+        documents and runs on a pool of INGEST_WORKERS threads along with
+        chunking. Chunks are embedded and upserted into Chroma in batches of
+        INGEST_EMBED_BATCH_SIZE, and a file's manifest entry is recorded once
+        all of its chunks are written. Returns the filenames in each category
+        ('added', 'updated', 'unchanged', 'failed').
+        """
+        changes: Dict[str, List[str]] = {"added": [], "updated": [], "unchanged": [], "failed": []}
+        sources = list(dict(sources).items())  # a later source for the same file wins
+        if not sources:
+            return changes
+        
+        # Find pre-manifest vectors before any new (not yet tracked) chunks are written
+        with self._manifest_lock:
+            has_untracked = any(filename not in self.doc_manifest for filename, _ in sources)
+        if has_untracked:
+            with self._legacy_lock:
+                self._load_legacy_vectors()
+        
+        # filename -> [status, hash, chunks still to write, node ids, previous manifest entry]
+        in_progress: Dict[str, list] = {}
+        pending_nodes: List[BaseNode] = []
+        progress = {"docs": 0, "chunks": 0, "started": time.monotonic()}
+        
+        def write_batch(nodes: List[BaseNode]):
+            if nodes:
+                self._upsert_nodes(nodes)
+                progress["chunks"] += len(nodes)
+            
+            for node in nodes:
+                in_progress[node.metadata["file_name"]][2] -= 1
+            finished = [(filename, entry) for filename, entry in in_progress.items() if entry[2] == 0]
+            for filename, _ in finished:
+                del in_progress[filename]
+            if not finished:
+                return
+            
+            with self._manifest_lock:
+                for filename, (status, content_hash, _, node_ids, _) in finished:
+                    self.doc_manifest[filename] = {"hash": content_hash, "node_ids": node_ids}
+                self._save_manifest()
+            for filename, (status, _, _, _, previous) in finished:
+                # The new version is live; now drop the old one
+                if previous and previous.get("node_ids"):
+                    self.chroma_collection.delete(ids=previous["node_ids"])
+                changes[status].append(filename)
+            progress["docs"] += len(finished)
+            if nodes:
+                self._print_ingest_progress(progress, len(sources))
+        
+        with ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix='ingest') as executor:
+            futures = {executor.submit(self._prepare_documents, filename, load): filename for filename, load in sources}
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    status, content_hash, nodes, previous = future.result()
+                except Exception as e:
+                    print(f"Error ingesting {filename}: {str(e)}")
+                    changes["failed"].append(filename)
+                    progress["docs"] += 1
+                    continue
+                
+                if status == "unchanged":
+                    changes["unchanged"].append(filename)
+                    progress["docs"] += 1
+                    continue
+                
+                if previous is None:
+                    # Clear vectors from before the manifest existed so they aren't duplicated
+                    self._delete_untracked_vectors(filename)
+                in_progress[filename] = [status, content_hash, len(nodes), [node.node_id for node in nodes], previous]
+                pending_nodes.extend(nodes)
+                
+                if not nodes:
+                    write_batch([])  # Empty file: nothing to embed, just record it
+                while len(pending_nodes) >= INGEST_EMBED_BATCH_SIZE:
+                    write_batch(pending_nodes[:INGEST_EMBED_BATCH_SIZE])
+                    del pending_nodes[:INGEST_EMBED_BATCH_SIZE]
+        
+        # Workers are done; write the final partial batch
+        if pending_nodes:
+            write_batch(pending_nodes)
+        if progress.get("reported") != progress["docs"]:
+            self._print_ingest_progress(progress, len(sources))
+        
+        if changes["added"] or changes["updated"]:
+            if self.index is None:
+                self.index = self._load_index()
+            self._bump_index_version()
+        return changes
+    
+    def _read_file(self, doc_path: str) -> List[Document]:
+        """Load one file's documents."""
+        return SimpleDirectoryReader(input_files=[doc_path]).load_data()
+    
+    def _prepare_documents(self, filename: str, load: Callable[[], List[Document]]) -> Tuple[str, str, List[BaseNode], Optional[Dict[str, Any]]]:
+        """Load and chunk one file for bulk ingestion, skipping it if its content is already indexed.
+        
+        Returns the status, content hash, nodes and the file's previous manifest entry.
+        """
+        documents = load()
+        content_hash = self._content_hash(documents)
+        with self._manifest_lock:
+            previous = self.doc_manifest.get(filename)
+        if previous and previous.get("hash") == content_hash:
+            return "unchanged", content_hash, [], previous
+        
+        for document in documents:
+            document.metadata["file_name"] = filename
+        nodes = Settings.node_parser.get_nodes_from_documents(documents)
+        return ("updated" if previous else "added"), content_hash, nodes, previous
+    
+    def _upsert_nodes(self, nodes: List[BaseNode]):
+        """Embed a batch of nodes in one call and upsert them into the docs collection."""
+        embeddings = Settings.embed_model.get_text_embedding_batch(
+            [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        )
+        metadatas = []
+        for node in nodes:
+            # Same layout ChromaVectorStore writes, so the nodes load back into the index
+            metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=self.vector_store.flat_metadata)
+            metadatas.append({key: "" if value is None else value for key, value in metadata.items()})
+        self.chroma_collection.upsert(
+            ids=[node.node_id for node in nodes],
+            embeddings=embeddings,
+            documents=[node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes],
+            metadatas=metadatas
+        )
+    
+    def _print_ingest_progress(self, progress: Dict[str, Any], total: int):
+        """Print bulk ingestion progress and throughput."""
+        elapsed = max(time.monotonic() - progress["started"], 1e-6)
+        progress["reported"] = progress["docs"]
+        print(f"  {progress['docs']}/{total} docs, {progress['chunks']} chunks "
+              f"({progress['docs'] / elapsed:.1f} docs/s, {progress['chunks'] / elapsed:.1f} chunks/s)")
+    
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """Load the docs manifest (filename -> node ids)."""
+        try:
+            with open(DOC_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_manifest(self):
+        """Write the docs manifest atomically (caller holds the manifest lock)."""
+        tmp_path = DOC_MANIFEST_PATH + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.doc_manifest, f)
+        os.replace(tmp_path, DOC_MANIFEST_PATH)
+    
     def ingest_file(self, file_path: str) -> str:
         """Ingest a file into the index."""
         # Check if file exists
@@ -130,15 +506,12 @@ class DocumentRetriever:
         documents = SimpleDirectoryReader(input_files=[doc_path]).load_data()
         
         # Add to index
-        if self.index is None:
-            self.index = VectorStoreIndex.from_documents(
-                documents,
-                storage_context=self.storage_context
-            )
-        else:
-            self.index.insert_nodes(documents)
+        status = self._index_documents(os.path.basename(doc_path), documents)
+        if status == "unchanged":
+            return f"Unchanged: {os.path.basename(file_path)} (already indexed)"
         
-        return f"Ingested {os.path.basename(file_path)}"
+        self._bump_index_version()
+        return f"{'Updated' if status == 'updated' else 'Ingested'} {os.path.basename(file_path)}"
     
     def ingest_from_url(self, url: str) -> str:
         """Ingest a document from a URL."""
@@ -159,15 +532,12 @@ class DocumentRetriever:
         document = Document(text=content, metadata={"source": url})
         
         # Add to index
-        if self.index is None:
-            self.index = VectorStoreIndex.from_documents(
-                [document],
-                storage_context=self.storage_context
-            )
-        else:
-            self.index.insert_nodes([document])
+        status = self._index_documents(file_name, [document])
+        if status == "unchanged":
+            return f"Unchanged: document from {url} (already indexed)"
         
-        return f"Ingested document from {url}"
+        self._bump_index_version()
+        return f"{'Updated' if status == 'updated' else 'Ingested'} document from {url}"
     
     def ingest_content(self, content: str, filename: str) -> str:
         """Ingest content directly into the index."""
@@ -182,15 +552,12 @@ class DocumentRetriever:
         document = Document(text=content, metadata={"source": filename})
         
         # Add to index
-        if self.index is None:
-            self.index = VectorStoreIndex.from_documents(
-                [document],
-                storage_context=self.storage_context
-            )
-        else:
-            self.index.insert_nodes([document])
+        status = self._index_documents(filename, [document])
+        if status == "unchanged":
+            return f"Unchanged: {filename} (already indexed)"
         
-        return f"Ingested document: {filename}"
+        self._bump_index_version()
+        return f"{'Updated' if status == 'updated' else 'Ingested'} document: {filename}"
     
     def ingest_from_github_repo(self, repo_owner: str, repo_name: str, path: str = "", branch: str = "main", token: str = None) -> str:
         """Ingest all .md files from a GitHub repository.
@@ -262,82 +629,329 @@ class DocumentRetriever:
         
         print(f"Found {len(md_files)} markdown file(s), ingesting...")
         
-        # Ingest each file
-        ingested_count = 0
-        errors = []
-        
+        def download(file_info: Dict[str, str], doc_path: str) -> List[Document]:
+            """Download one file into docs/ (runs on an ingestion worker)."""
+            file_response = requests.get(file_info["download_url"], headers={"Authorization": f"token {token}"} if token else {})
+            file_response.raise_for_status()
+            content = file_response.text
+            
+            # Save content to docs directory
+            with open(doc_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            
+            # Create document object
+            return [Document(
+                text=content,
+                metadata={
+                    "source": f"github:{repo_owner}/{repo_name}/{file_info['path']}",
+                    "github_path": file_info["path"],
+                    "repo": f"{repo_owner}/{repo_name}"
+                }
+            )]
+        
+        # Download, chunk and embed the files in bulk
+        sources = []
         for file_info in md_files:
-            try:
-                # Download file content
-                download_url = file_info["download_url"]
-                file_response = requests.get(download_url, headers={"Authorization": f"token {token}"} if token else {})
-                file_response.raise_for_status()
-                content = file_response.text
-                
-                # Create filename with path structure to avoid conflicts
-                # Use path as filename prefix to preserve directory structure
-                safe_path = file_info["path"].replace("/", "_").replace("\\", "_")
-                filename = f"github_{repo_owner}_{repo_name}_{safe_path}"
-                
-                # Save content to docs directory
-                doc_path = os.path.join('docs', filename)
-                with open(doc_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                
-                # Create document object
-                document = Document(
-                    text=content,
-                    metadata={
-                        "source": f"github:{repo_owner}/{repo_name}/{file_info['path']}",
-                        "github_path": file_info["path"],
-                        "repo": f"{repo_owner}/{repo_name}"
-                    }
-                )
-                
-                # Add to index
-                if self.index is None:
-                    self.index = VectorStoreIndex.from_documents(
-                        [document],
-                        storage_context=self.storage_context
-                    )
-                else:
-                    self.index.insert_nodes([document])
-                
-                ingested_count += 1
-                print(f"  ✓ Ingested: {file_info['path']}")
-                
-            except Exception as e:
-                error_msg = f"Error ingesting {file_info['path']}: {str(e)}"
-                errors.append(error_msg)
-                print(f"  ✗ {error_msg}")
-        
+            # Create filename with path structure to avoid conflicts
+            # Use path as filename prefix to preserve directory structure
+            safe_path = file_info["path"].replace("/", "_").replace("\\", "_")
+            filename = f"github_{repo_owner}_{repo_name}_{safe_path}"
+            sources.append((filename, functools.partial(download, file_info, os.path.join('docs', filename))))
+        changes = self.ingest_documents(sources)
+        
+        ingested_count = len(changes["added"]) + len(changes["updated"]) + len(changes["unchanged"])
         result = f"Ingested {ingested_count}/{len(md_files)} files from {repo_owner}/{repo_name}"
-        if errors:
-            result += f"\nErrors: {len(errors)} file(s) failed"
+        result += f" ({len(changes['added'])} new, {len(changes['updated'])} updated, {len(changes['unchanged'])} unchanged)"
+        if changes["failed"]:
+            result += f"\nErrors: {len(changes['failed'])} file(s) failed"
         
         return result
     
     def get_relevant_context(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Retrieve relevant context for a query."""
-        if self.index is None:
-            return []
+        """Retrieve relevant context for a query from the docs and chat history.
         
-        # Create retriever
-        retriever = self.index.as_retriever(similarity_top_k=top_k)
+        The query is embedded once, both collections are searched with that
+        embedding, and the hits are merged by cosine similarity.
+        """
+        return self._retrieve_batch([query], top_k)[0]
+    
+    async def aget_relevant_context(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Async get_relevant_context that keeps embedding and search off the event loop.
+        
+        Queries arriving within RETRIEVAL_BATCH_WINDOW_MS of each other share
+        one embedding pass and one vector search per collection.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_queries.append((query, top_k, future))
+        
+        if len(self._pending_queries) >= RETRIEVAL_MAX_BATCH:
+            if self._batch_handle is not None:
+                self._batch_handle.cancel()
+            self._dispatch_query_batch()
+        elif self._batch_handle is None:
+            self._batch_handle = loop.call_later(RETRIEVAL_BATCH_WINDOW_MS / 1000, self._dispatch_query_batch)
+        
+        return await future
+    
+    async def aembed_query(self, query: str) -> List[float]:
+        """Embed a query on the retrieval pool, sharing the query embedding cache with retrieval."""
+        loop = asyncio.get_running_loop()
+        embeddings = await loop.run_in_executor(self._retrieval_executor, self._embed_queries, [query])
+        return embeddings[0]
+    
+    def _dispatch_query_batch(self):
+        """Send the waiting queries to the retrieval pool as one batch."""
+        self._batch_handle = None
+        batch = self._pending_queries[:RETRIEVAL_MAX_BATCH]
+        del self._pending_queries[:RETRIEVAL_MAX_BATCH]
+        if self._pending_queries:
+            self._batch_handle = asyncio.get_running_loop().call_soon(self._dispatch_query_batch)
+        
+        # Callers that gave up (e.g. timed out) don't need results
+        batch = [item for item in batch if not item[2].done()]
+        if batch:
+            asyncio.get_running_loop().create_task(self._run_query_batch(batch))
+    
+    async def _run_query_batch(self, batch: List[Tuple[str, int, asyncio.Future]]):
+        """Run a batch of queries on the retrieval pool and resolve their futures."""
+        loop = asyncio.get_running_loop()
+        top_k = max(item[1] for item in batch)
+        try:
+            results = await loop.run_in_executor(
+                self._retrieval_executor, self._retrieve_batch, [item[0] for item in batch], top_k
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, query_top_k, future), context in zip(batch, results):
+            if not future.done():
+                future.set_result(context[:query_top_k])
+    
+    def _retrieve_batch(self, queries: List[str], top_k: int) -> List[List[Dict[str, Any]]]:
+        """Embed several queries together and search every collection for all of them."""
+        version = self.index_version
+        results: List[Optional[List[Dict[str, Any]]]] = [self._get_cached_result(query, top_k, version) for query in queries]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        
+        collections = [self.chat_collection]
+        if self.index is not None:
+            collections.insert(0, self.chroma_collection)
+        collections = [collection for collection in collections if collection.count() > 0]
+        if not collections:
+            return [result or [] for result in results]
+        
+        query_embeddings = self._embed_queries([queries[i] for i in missing])
+        
+        contexts: List[List[Dict[str, Any]]] = [[] for _ in missing]
+        for collection in collections:
+            for context, hits in zip(contexts, self._query_collection(collection, query_embeddings, top_k)):
+                context.extend(hits)
+        
+        for i, context in zip(missing, contexts):
+            context.sort(key=lambda item: item["score"], reverse=True)
+            del context[top_k:]
+            self._cache_result(queries[i], top_k, version, context)
+            results[i] = context
+        return results
+    
+    def _get_cached_result(self, query: str, top_k: int, version: int) -> Optional[List[Dict[str, Any]]]:
+        """Get a cached retrieval result for this index version, if still fresh."""
+        key = (normalize_query(query), top_k, version)
+        with self._result_cache_lock:
+            cached = self._result_cache.get(key)
+            if cached is None:
+                return None
+            stored_at, context = cached
+            if time.monotonic() - stored_at > RETRIEVAL_CACHE_TTL:
+                del self._result_cache[key]
+                return None
+            self._result_cache.move_to_end(key)
+        return [dict(item) for item in context]
+    
+    def _cache_result(self, query: str, top_k: int, version: int, context: List[Dict[str, Any]]):
+        """Remember a retrieval result, unless the index changed while it was computed."""
+        with self._result_cache_lock:
+            if version != self.index_version:
+                return
+            self._result_cache[(normalize_query(query), top_k, version)] = (time.monotonic(), [dict(item) for item in context])
+            while len(self._result_cache) > RETRIEVAL_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+    
+    def _bump_index_version(self):
+        """Invalidate cached retrieval results after the indexed content changes."""
+        with self._result_cache_lock:
+            self.index_version += 1
+            self._result_cache.clear()
+    
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed queries, reusing cached vectors and batching the rest."""
+        embeddings = [self.embedding_cache.get(query) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = self._compute_query_embeddings([queries[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                self.embedding_cache.set(queries[i], embedding)
+                embeddings[i] = embedding
+        return embeddings
+    
+    def _compute_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Embed queries in a single forward pass when the model supports it."""
+        embed_model = Settings.embed_model
+        if len(queries) > 1 and hasattr(embed_model, '_embed'):
+            try:
+                # HuggingFaceEmbedding: batch encode with the model's query prompt
+                return embed_model._embed(queries, prompt_name="query")
+            except TypeError:
+                pass
+        return [embed_model.get_query_embedding(query) for query in queries]
+    
+    def _query_collection(self, collection, query_embeddings: List[List[float]], top_k: int) -> List[List[Dict[str, Any]]]:
+        """Search one Chroma collection with precomputed query embeddings (one hit list per query)."""
+        result = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=min(top_k, collection.count()),
+            include=["documents", "metadatas", "distances"]
+        )
         
-        # Get relevant nodes
-        nodes = retriever.retrieve(query)
+        hits = []
+        for documents, metadatas, distances in zip(result["documents"], result["metadatas"], result["distances"]):
+            hits.append([
+                {
+                    "text": text,
+                    "score": 1 - distance,  # cosine distance -> similarity
+                    "source": (metadata or {}).get("source", "Unknown")
+                }
+                for text, metadata, distance in zip(documents, metadatas, distances)
+            ])
+        return hits
+    
+    def index_chat_messages(self) -> int:
+        """Embed new conversation windows from the message store into the chat collection.
         
-        # Format context
-        context = []
-        for i, node in enumerate(nodes):
-            context.append({
-                "text": node.text,
-                "score": node.score,
-                "source": node.metadata.get("source", "Unknown")
+        Messages are grouped per channel into windows that end after
+        CHAT_WINDOW_MESSAGES messages or CHAT_WINDOW_GAP_MINUTES of silence.
+        A channel's still-open window is left for a later pass, which re-reads
+        it from that channel's mark. Returns the number of windows added.
+        """
+        with self._chat_index_lock:
+            state = self._load_chat_index_state()
+            channel_marks = state["channels"]
+            messages = get_messages_since(state["watermark"], limit=CHAT_FETCH_LIMIT)
+            fetch_truncated = len(messages) >= CHAT_FETCH_LIMIT
+            
+            # Pick up windows left open on earlier passes; they sit below the watermark
+            reopened = []
+            for key in state["open_channels"]:
+                reopened.extend(
+                    msg for msg in get_messages_since(channel_marks.get(key, 0), limit=CHAT_WINDOW_MESSAGES, channel_id=int(key))
+                    if msg["id"] <= state["watermark"]
+                )
+            if not messages and not reopened:
+                return 0
+            new_watermark = messages[-1]["id"] if messages else state["watermark"]
+            messages = sorted(reopened + messages, key=lambda msg: msg["id"])
+            
+            # Skip messages already covered by a window indexed on an earlier pass
+            by_channel: Dict[int, List[Dict[str, Any]]] = {}
+            for msg in messages:
+                if msg["id"] > channel_marks.get(str(msg["channel_id"]), 0):
+                    by_channel.setdefault(msg["channel_id"], []).append(msg)
+            
+            # A window is still open if it's recent relative to the newest message we can see
+            latest = _message_time(messages[-1]) if fetch_truncated else datetime.datetime.now()
+            gap = datetime.timedelta(minutes=CHAT_WINDOW_GAP_MINUTES)
+            windows = []
+            open_channels = []
+            for channel_id, channel_messages in by_channel.items():
+                channel_windows = self._split_chat_windows(channel_messages, gap)
+                last = channel_windows[-1]
+                if len(last) < CHAT_WINDOW_MESSAGES and latest - _message_time(last[-1]) < gap:
+                    # The conversation may still continue; index it once it's closed
+                    open_channels.append(str(channel_id))
+                    channel_windows.pop()
+                windows.extend(channel_windows)
+            
+            added = self._add_chat_windows(windows)
+            if added:
+                self._bump_index_version()
+            
+            for window in windows:
+                key = str(window[0]["channel_id"])
+                channel_marks[key] = max(channel_marks.get(key, 0), window[-1]["id"])
+            state["watermark"] = new_watermark
+            state["open_channels"] = open_channels
+            self._save_chat_index_state(state)
+            
+            return added
+    
+    def _split_chat_windows(self, messages: List[Dict[str, Any]], gap: datetime.timedelta) -> List[List[Dict[str, Any]]]:
+        """Split one channel's messages into conversation windows."""
+        windows = [[messages[0]]]
+        for msg in messages[1:]:
+            current = windows[-1]
+            if len(current) >= CHAT_WINDOW_MESSAGES or _message_time(msg) - _message_time(current[-1]) > gap:
+                windows.append([msg])
+            else:
+                current.append(msg)
+        return windows
+    
+    def _add_chat_windows(self, windows: List[List[Dict[str, Any]]]) -> int:
+        """Embed conversation windows in batches and upsert them into the chat collection."""
+        ids, texts, metadatas = [], [], []
+        for window in windows:
+            text = f"Conversation on {window[0]['timestamp'][:10]}:\n" + "\n".join(
+                f"{msg['author']}: {msg['content']}" for msg in window
+            )
+            if len(text) < CHAT_MIN_WINDOW_CHARS:
+                continue
+            
+            channel_id = window[0]["channel_id"]
+            ids.append(f"chat:{channel_id}:{window[0]['id']}")
+            texts.append(text)
+            metadatas.append({
+                "source": f"chat:{channel_id}",
+                "channel_id": channel_id,
+                "first_message_id": window[0]["id"],
+                "last_message_id": window[-1]["id"],
+                "timestamp": window[0]["timestamp"]
             })
         
-        return context
+        for start in range(0, len(texts), CHAT_EMBED_BATCH_SIZE):
+            end = start + CHAT_EMBED_BATCH_SIZE
+            self.chat_collection.upsert(
+                ids=ids[start:end],
+                embeddings=Settings.embed_model.get_text_embedding_batch(texts[start:end]),
+                documents=texts[start:end],
+                metadatas=metadatas[start:end]
+            )
+        
+        return len(texts)
+    
+    def _load_chat_index_state(self) -> Dict[str, Any]:
+        """Load the chat indexing watermark (last message id scanned), per-channel progress and channels with open windows."""
+        try:
+            with open(CHAT_INDEX_STATE_PATH, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return {
+                "watermark": int(state.get("watermark", 0)),
+                "channels": dict(state.get("channels", {})),
+                "open_channels": list(state.get("open_channels", []))
+            }
+        except (OSError, ValueError):
+            return {"watermark": 0, "channels": {}, "open_channels": []}
+    
+    def _save_chat_index_state(self, state: Dict[str, Any]):
+        """Persist the chat indexing watermark."""
+        tmp_path = CHAT_INDEX_STATE_PATH + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, CHAT_INDEX_STATE_PATH)
     
     def list_documents(self) -> List[Dict[str, Any]]:
         """List all documents in the docs directory."""
@@ -368,37 +982,24 @@ class DocumentRetriever:
         return documents
     
     def delete_document(self, filename: str) -> str:
-        """Delete a document from the docs directory and rebuild the index."""
+        """Delete a document from the docs directory and remove its vectors from the index.
+        
+        Only that document's nodes are deleted; the rest of the index stays live.
+        """
         doc_path = os.path.join('docs', filename)
         
         # Check if file exists
         if not os.path.exists(doc_path):
             raise FileNotFoundError(f"Document not found: {filename}")
         
+        # Remove the vectors first so a failure leaves the file and index consistent
+        self._remove_document_vectors(filename)
+        
         # Delete the file
         os.remove(doc_path)
         
-        # Rebuild the index
-        # For simplicity, we'll delete the collection and rebuild from scratch
-        try:
-            self.chroma_client.delete_collection("discord_docs")
-        except Exception as e:
-            print(f"Error deleting collection: {str(e)}")
-        
-        # Create new collection
-        self.chroma_collection = self.chroma_client.create_collection(
-            name="discord_docs",
-            metadata={"hnsw:space": "cosine"}
-        )
-        
-        # Update vector store and storage context
-        self.vector_store = ChromaVectorStore(chroma_collection=self.chroma_collection)
-        self.storage_context = StorageContext.from_defaults(vector_store=self.vector_store)
-        
-        # Rebuild index if there are still documents
-        if os.path.exists('docs') and len([f for f in os.listdir('docs') if not f.startswith('.') and f != 'README.md']) > 0:
-            self.index = self._create_index()
-        else:
+        if not [f for f in os.listdir('docs') if not f.startswith('.') and f != 'README.md']:
             self.index = None
         
+        self._bump_index_version()
         return f"Deleted document: {filename}" 
\ No newline at end of file